@@ -19,6 +19,7 @@ set CHECKPOINT_INTERVAL 4     # Alle 4 Runden: Extended Validation
 set MAX_FAILED_REPAIRS 5      # Emergency Stop nach X fehlgeschlagenen Repairs
 set MILESTONE_INTERVAL 5      # Git Tag alle 5 Loops
 set ENABLE_HTML_REPORT true   # HTML Final Report generieren
+set BUILD_OUTPUT_FILE "agent_build.log"  # Output des letzten Builds (für Repair-Prompt)
 
 # Statistik-Variablen (global für Funktions-Zugriff)
 set -g TOTAL_PHASES 0
@@ -29,6 +30,10 @@ set -g TOTAL_FILES_CHANGED 0
 set -g TOTAL_LINES_ADDED 0
 set -g TOTAL_LINES_REMOVED 0
 
+# Build-Cache: Ergebnis des zuletzt gebauten Trees
+set -g LAST_BUILD_KEY ""
+set -g LAST_BUILD_STATUS 1
+
 # Phase-spezifische Erfolge (global für Funktions-Zugriff)
 set -g PHASE_1_SUCCESS 0
 set -g PHASE_2_SUCCESS 0
@@ -614,9 +619,11 @@ function update_phase_stats
 end
 
 function track_git_stats
-    set -l last_commit_files (git diff HEAD~1 HEAD --numstat 2>/dev/null | wc -l)
-    set -l last_commit_added (git diff HEAD~1 HEAD --numstat 2>/dev/null | awk '{added+=$1} END {print added}')
-    set -l last_commit_removed (git diff HEAD~1 HEAD --numstat 2>/dev/null | awk '{removed+=$2} END {print removed}')
+    # Einmal numstat, alle drei Werte (Files, Added, Removed) in einem awk-Lauf
+    set -l numstat (git diff HEAD~1 HEAD --numstat 2>/dev/null | awk '{files++; added+=$1; removed+=$2} END {if (files) print files, added, removed}' | string split ' ')
+    set -l last_commit_files $numstat[1]
+    set -l last_commit_added $numstat[2]
+    set -l last_commit_removed $numstat[3]
 
     if test -n "$last_commit_added"
         set TOTAL_FILES_CHANGED (math $TOTAL_FILES_CHANGED + $last_commit_files)
@@ -625,9 +632,35 @@ function track_git_stats
     end
 end
 
+function build_key
+    # Tree des Working Directory (wie `git add -A` ihn committen würde) + Lockfile-Hash.
+    # Gestaged wird in eine Kopie des Index, der echte Index bleibt unberührt.
+    set -l tmp_index (mktemp)
+    cp (git rev-parse --git-path index) $tmp_index 2>/dev/null; or rm -f $tmp_index
+    env GIT_INDEX_FILE=$tmp_index git add -A -- . \
+        ':(exclude)agent.log' ':(exclude)agent_errors.log' ':(exclude)agent_metrics.jsonl' \
+        ':(exclude)agent_report.html' ':(exclude)agent_build.log' ':(exclude)Claude_configured.fish' 2>/dev/null
+    set -l tree (env GIT_INDEX_FILE=$tmp_index git write-tree 2>/dev/null)
+    rm -f $tmp_index
+    set -l lock (cat package-lock.json yarn.lock pnpm-lock.yaml 2>/dev/null | git hash-object --stdin)
+    test -n "$tree"; and echo "$tree:$lock"
+end
+
+function run_build
+    # Gleicher Tree + gleiches Lockfile = gleiches Ergebnis: kein zweiter Build.
+    # Output liegt immer in $BUILD_OUTPUT_FILE, bei Cache-Hit noch vom gleichen Tree.
+    set -l key (build_key)
+    if test -z "$key"; or test "$key" != "$LAST_BUILD_KEY"
+        npm run build > $BUILD_OUTPUT_FILE 2>&1
+        set -g LAST_BUILD_STATUS $status
+        set -g LAST_BUILD_KEY $key
+    end
+    return $LAST_BUILD_STATUS
+end
+
 function check_and_repair
     log_msg "🛠️  Build Check..."
-    npm run build > /dev/null 2>&1
+    run_build
 
     if test $status -eq 0
         log_success "Build SUCCESS"
@@ -636,7 +669,7 @@ function check_and_repair
         return 0
     else
         log_error "BUILD FAILED! Starting Emergency Repair..."
-        set ERROR_LOG (npm run build 2>&1 | tail -n 50)
+        set ERROR_LOG (tail -n 50 $BUILD_OUTPUT_FILE)
 
         set REPAIR_PROMPT "🚨 CRITICAL BUILD FAILURE - Emergency QA Engineer Mode.
 
@@ -681,7 +714,7 @@ Execute minimal fix NOW."
 
         # Verify Fix
         log_msg "🔍 Verifying repair..."
-        npm run build > /dev/null 2>&1
+        run_build
         if test $status -eq 0
             log_success "Repair SUCCESSFUL!"
             git add .
@@ -791,7 +824,7 @@ function pre_flight_check
 
     # Initial build check
     log_msg "🏗️  Testing initial build..."
-    npm run build > /dev/null 2>&1
+    run_build
     if test $status -ne 0
         log_error "Initial build FAILED! Fix manually before starting."
         return 1
@@ -1119,7 +1152,7 @@ for i in (seq 1 $MAX_LOOPS)
         log_msg ""
         log_msg "🔍 ═══ CHECKPOINT $i ═══"
         log_msg "Running Extended Validation..."
-        npm run build > /dev/null 2>&1
+        run_build
         if test $status -eq 0
             log_success "Checkpoint Build: PASSED"
             log_metric "checkpoint_$i" "passed"
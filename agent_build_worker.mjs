@@ -0,0 +1,111 @@
+#!/usr/bin/env node
+/**
+ * Scalesite Agent - Warm build worker
+ * Keeps vite loaded in one node process and runs builds on request over a
+ * Unix socket. Protocol: one JSON object per line in each direction.
+ *
+ *   -> {"id": 1, "root": "/path/to/project"}
+ *   <- {"id": 1, "ok": true, "errors": [], "chunks": [{"file": "...", "size": 123}], "duration": 1.2}
+ *
+ * Worker problems (vite not installed, bad request) come back as
+ * {"id": 1, "error": "..."} so the caller can fall back to `npm run build`.
+ * The worker exits when its stdin closes, i.e. when the control panel goes away.
+ */
+
+import fs from 'node:fs';
+import net from 'node:net';
+import path from 'node:path';
+import { createRequire } from 'node:module';
+import { pathToFileURL } from 'node:url';
+
+const socketPath = process.argv[2];
+const viteByRoot = new Map();
+
+// Builds share dist/, so they run one at a time
+let queue = Promise.resolve();
+
+function loadVite(root) {
+    if (!viteByRoot.has(root)) {
+        const require = createRequire(path.join(root, 'package.json'));
+        const viteDir = path.dirname(require.resolve('vite/package.json'));
+        viteByRoot.set(root, import(pathToFileURL(path.join(viteDir, 'dist', 'node', 'index.js')).href));
+    }
+    return viteByRoot.get(root);
+}
+
+function describeError(error) {
+    return {
+        message: String(error.message || error).split('\n')[0],
+        file: error.id || (error.loc && error.loc.file) || null,
+        line: error.loc ? error.loc.line : null,
+        column: error.loc ? error.loc.column : null,
+        frame: error.frame || null
+    };
+}
+
+async function build(root) {
+    const vite = await loadVite(root);
+    // PostCSS/Tailwind and some plugins resolve their config from the cwd
+    process.chdir(root);
+    const started = process.hrtime.bigint();
+    const seconds = () => Number(process.hrtime.bigint() - started) / 1e9;
+    try {
+        const result = await vite.build({ root, logLevel: 'silent' });
+        const chunks = [];
+        for (const output of [].concat(result)) {
+            for (const item of output.output || []) {
+                const body = item.type === 'chunk' ? item.code : item.source;
+                chunks.push({ file: item.fileName, size: Buffer.byteLength(body || '') });
+            }
+        }
+        return { ok: true, errors: [], chunks, duration: seconds() };
+    } catch (error) {
+        return { ok: false, errors: [].concat(error.errors || error).map(describeError), chunks: [], duration: seconds() };
+    }
+}
+
+async function handle(request) {
+    if (request.cmd === 'ping') {
+        return { id: request.id, ok: true };
+    }
+    try {
+        return { id: request.id, ...(await build(request.root)) };
+    } catch (error) {
+        viteByRoot.delete(request.root);
+        return { id: request.id, error: String(error.message || error) };
+    }
+}
+
+const server = net.createServer((socket) => {
+    let buffer = '';
+    socket.setEncoding('utf8');
+    socket.on('data', (data) => {
+        buffer += data;
+        let newline;
+        while ((newline = buffer.indexOf('\n')) >= 0) {
+            const line = buffer.slice(0, newline);
+            buffer = buffer.slice(newline + 1);
+            let request;
+            try {
+                request = JSON.parse(line);
+            } catch (error) {
+                socket.write(JSON.stringify({ error: 'invalid request' }) + '\n');
+                continue;
+            }
+            queue = queue.then(() => handle(request)).then((response) => {
+                if (!socket.destroyed) {
+                    socket.write(JSON.stringify(response) + '\n');
+                }
+            });
+        }
+    });
+    socket.on('error', () => {});
+});
+
+if (fs.existsSync(socketPath)) {
+    fs.unlinkSync(socketPath);
+}
+server.listen(socketPath);
+
+process.stdin.on('end', () => process.exit(0));
+process.stdin.resume();
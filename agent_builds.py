@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Build result cache and warm build worker
+Memoizes `npm run build` by the git tree of the working directory plus the
+lockfile, and runs vite builds in a long-lived node process
+"""
+
+import hashlib
+import json
+import os
+import re
+import socket
+import sqlite3
+import subprocess
+import threading
+import time
+
+LOCKFILES = ("package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lockb")
+
+# Files the agent itself writes into the project; they never affect the build
+# but change on every log line, so they are left out of the tree hash
+AGENT_FILES = (
+    "agent.log", "agent_errors.log", "agent_metrics.jsonl", "agent_report.html",
+    "agent_build.log", "agent_config.json", "agent_history.json", "agent_history.jsonl",
+    "agent_history.jsonl.idx", "agent_commits.db", "agent_builds.db", "Claude_configured.fish"
+)
+
+# Output kept per build; the repair prompt only uses the last 50 lines
+OUTPUT_LINES = 200
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agent_build_worker.mjs")
+
+# Build scripts the worker can run in-process; anything else uses npm. A
+# leading tsc step is only skipped when the type-check tier already ran.
+WARM_BUILD_SCRIPT = re.compile(r'^\s*(?P<tsc>tsc(?:\s+-[-\w]+)*\s*&&\s*)?vite build\s*$')
+
+# Incremental type-check state, kept where git and vite never look. One file
+# per checkout: phase worktrees share node_modules with the main checkout.
+TSBUILDINFO_DIR = os.path.join("node_modules", ".cache", "scalesite")
+TSC_ERROR_PATTERN = re.compile(r'error TS\d+:')
+
+
+def lockfile_digest(repo_dir):
+    """Hash of every lockfile present, so dependency changes miss the cache"""
+    digest = hashlib.sha1()
+    for name in LOCKFILES:
+        path = os.path.join(repo_dir, name)
+        if os.path.exists(path):
+            digest.update(name.encode('utf-8') + b'\0')
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 16), b''):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def build_key(tree, lock_digest):
+    return f"{tree}:{lock_digest}"
+
+
+class BuildCache:
+    """Build results (pass/fail plus output tail) keyed by tree and lockfile.
+
+    A build is a pure function of the sources and the installed dependencies,
+    so a tree that was already built - the checkpoint build right after
+    phase 5, a repair that changed nothing, the pre-flight build of the tree
+    the last run ended on - is answered from here without running vite.
+    Only passing builds are stored; a failure may be flaky (OOM, a killed
+    worker), so it is remembered in memory until the next run starts.
+    """
+
+    def __init__(self, db_path, max_entries=500):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS builds (
+                key TEXT PRIMARY KEY,
+                ok INTEGER NOT NULL,
+                output TEXT NOT NULL,
+                built_at REAL NOT NULL
+            );
+        """)
+        # Databases written by older versions also hold failures
+        self.db.execute("DELETE FROM builds WHERE ok = 0")
+        self.db.commit()
+        self.failures = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """(ok, output) for a known key, else None"""
+        with self.lock:
+            if key in self.failures:
+                self.hits += 1
+                return False, self.failures[key]
+            row = self.db.execute("SELECT ok, output FROM builds WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return bool(row[0]), row[1]
+
+    def put(self, key, ok, output):
+        tail = '\n'.join(output.splitlines()[-OUTPUT_LINES:])
+        with self.lock:
+            if not ok:
+                self.failures[key] = tail
+                return
+            self.failures.pop(key, None)
+            self.db.execute(
+                "INSERT OR REPLACE INTO builds (key, ok, output, built_at) VALUES (?, ?, ?, ?)",
+                (key, 1, tail, time.time())
+            )
+            self.db.execute(
+                "DELETE FROM builds WHERE key NOT IN "
+                "(SELECT key FROM builds ORDER BY built_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self.db.commit()
+
+    def forget_failures(self):
+        """Called when a run starts: its builds get a fresh chance to pass"""
+        with self.lock:
+            self.failures.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+def build_script(repo_dir):
+    """The project's `build` script from package.json, or None"""
+    try:
+        with open(os.path.join(repo_dir, 'package.json'), 'r') as f:
+            return json.load(f).get('scripts', {}).get('build')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def build_typechecks(repo_dir):
+    """True if the project's build script runs tsc itself"""
+    script = build_script(repo_dir)
+    return script is not None and re.search(r'(?:^|&&|;)\s*tsc\b', script) is not None
+
+
+def typecheck_command(repo_dir):
+    """argv for an incremental `tsc` check of the project, or None without TypeScript.
+
+    Project-reference setups already keep per-project .tsbuildinfo files under
+    `tsc -b`; single-project setups get `--incremental` with the state file
+    under node_modules/.cache, so only files affected by a change are rechecked.
+    """
+    tsc = os.path.join(repo_dir, 'node_modules', '.bin', 'tsc')
+    tsconfig = os.path.join(repo_dir, 'tsconfig.json')
+    if not os.path.exists(tsc) or not os.path.exists(tsconfig):
+        return None
+    with open(tsconfig, 'r') as f:
+        # tsconfig.json allows comments, so no json.load here
+        uses_references = re.search(r'"references"\s*:\s*\[\s*\{', f.read()) is not None
+    if uses_references:
+        return [tsc, '-b', '--pretty', 'false']
+    checkout = hashlib.sha1(os.path.abspath(repo_dir).encode('utf-8')).hexdigest()[:12]
+    buildinfo = os.path.join(repo_dir, TSBUILDINFO_DIR, f"{checkout}.tsbuildinfo")
+    return [tsc, '--noEmit', '--incremental', '--tsBuildInfoFile', buildinfo, '--pretty', 'false']
+
+
+def first_errors(output, limit=50):
+    """The first `limit` tsc error lines; repairs fix the first error only"""
+    errors = [line for line in output.splitlines() if TSC_ERROR_PATTERN.search(line)]
+    return '\n'.join(errors[:limit] or output.splitlines()[:limit])
+
+
+def format_result(result):
+    """Render a worker result like vite's own output, for logs and repair prompts"""
+    lines = []
+    for error in result.get('errors', []):
+        location = error.get('file') or ''
+        if location and error.get('line') is not None:
+            location += f":{error['line']}:{error.get('column') or 0}"
+        prefix = f"{location}: " if location else ""
+        lines.append(f"error during build: {prefix}{error.get('message', '')}")
+        if error.get('frame'):
+            lines.append(error['frame'])
+    for chunk in result.get('chunks', []):
+        lines.append(f"{chunk['file']}  {chunk['size'] / 1000:.2f} kB")
+    lines.append(f"{'✓ built' if result.get('ok') else '✗ build failed'} in {result.get('duration', 0):.2f}s")
+    return '\n'.join(lines)
+
+
+class BuildWorker:
+    """Control-panel-owned node process that keeps vite warm between builds.
+
+    `build()` starts the worker on first use and returns the structured
+    result (ok, errors, chunks, duration), or None when the worker cannot
+    serve the request - callers then fall back to `npm run build`.
+    """
+
+    def __init__(self, socket_path, script=WORKER_SCRIPT, timeout=900, start_timeout=10.0):
+        self.socket_path = socket_path
+        self.script = script
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.lock = threading.Lock()
+        self.process = None
+        self.request_id = 0
+        self.builds = 0
+        self.last_result = None
+
+    def supports(self, repo_dir, typechecked=False):
+        script = build_script(repo_dir)
+        match = WARM_BUILD_SCRIPT.match(script) if script else None
+        return match is not None and (typechecked or not match.group('tsc'))
+
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def _start(self):
+        if self.running():
+            return True
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        try:
+            # stdin stays open for the worker's lifetime; EOF tells it to exit
+            self.process = subprocess.Popen(
+                ['node', self.script, self.socket_path],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True
+            )
+        except OSError as e:
+            print(f"Error starting build worker: {e}")
+            self.process = None
+            return False
+
+        deadline = time.monotonic() + self.start_timeout
+        while not os.path.exists(self.socket_path):
+            if not self.running() or time.monotonic() > deadline:
+                print("Error starting build worker: socket did not appear")
+                self._stop()
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _stop(self):
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.stdin.close()
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+                    self.process.wait()
+            self.process = None
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def stop(self):
+        with self.lock:
+            self._stop()
+
+    def signal(self, sig):
+        """Send `sig` to the worker's process group (it runs in its own session)"""
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _request(self, payload):
+        self.request_id += 1
+        payload = dict(payload, id=self.request_id)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            conn.sendall((json.dumps(payload) + '\n').encode('utf-8'))
+            data = b''
+            while not data.endswith(b'\n'):
+                chunk = conn.recv(65536)
+                if not chunk:
+                    raise ConnectionError("build worker closed the connection")
+                data += chunk
+        return json.loads(data)
+
+    def build(self, root):
+        """Build `root` in the warm worker; None if the worker is unusable"""
+        with self.lock:
+            if not self._start():
+                return None
+            try:
+                result = self._request({"root": os.path.abspath(root)})
+            except (OSError, ValueError) as e:
+                print(f"Error talking to build worker: {e}")
+                self._stop()
+                return None
+            if 'error' in result:
+                print(f"Error in build worker: {result['error']}")
+                return None
+            self.builds += 1
+            self.last_result = result
+            return result
+
+    def status(self):
+        with self.lock:
+            return {
+                "running": self.running(),
+                "pid": self.process.pid if self.running() else None,
+                "builds": self.builds,
+                "last": self.last_result
+            }
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Log line classifier
+Turns agent output lines into typed events with one precompiled pattern
+"""
+
+import re
+from collections import namedtuple
+
+# Event kinds
+LOOP_START = "loop_start"
+PHASE_START = "phase_start"
+BUILD_SUCCESS = "build_success"
+BUILD_FAILED = "build_failed"
+REPAIR_SUCCESS = "repair_success"
+REPAIR_FAILED = "repair_failed"
+MILESTONE = "milestone"
+CHECKPOINT = "checkpoint"
+COMMIT = "commit"
+BUILD_CHECK = "build_check"
+REPAIR_VERIFY = "repair_verify"
+VALIDATION = "validation"
+PAUSE = "pause"
+HOLD = "hold"
+RESUME = "resume"
+
+EVENT_KINDS = (
+    LOOP_START, PHASE_START, BUILD_SUCCESS, BUILD_FAILED,
+    REPAIR_SUCCESS, REPAIR_FAILED, MILESTONE, CHECKPOINT, COMMIT,
+    BUILD_CHECK, REPAIR_VERIFY, VALIDATION, PAUSE, HOLD, RESUME
+)
+
+# Phase number -> phase_breakdown key
+PHASE_NAMES = {
+    1: "qa",
+    2: "design",
+    3: "performance",
+    4: "security",
+    5: "cleanup",
+    6: "testing"
+}
+
+# number/total/detail are filled where the line carries them, e.g.
+# LOOP_START(number=3, total=20), CHECKPOINT(detail="passed")
+LogEvent = namedtuple("LogEvent", ["kind", "number", "total", "detail", "level"])
+
+# The phrases below never overlap within a line, so leftmost-match order is fine
+EVENT_PATTERN = re.compile(r"""
+      LOOP\ (?P<loop>\d+)\ of\ (?P<loop_total>\d+)
+    | Phase\ (?P<phase>\d+)/(?P<phase_total>\d+)
+    | (?P<build_success>Build\ SUCCESS)
+    | (?P<build_failed>BUILD\ FAILED)
+    | (?P<repair_success>Repair\ SUCCESSFUL)
+    | (?P<repair_failed>Repair\ FAILED)
+    | MILESTONE\ REACHED:\ Loop\ (?P<milestone>\d+)
+    | Checkpoint\ Build:\ (?P<checkpoint>PASSED|FAILED)
+    | (?P<commit>git\ commit)
+    | (?P<build_check>Build\ Check)
+    | (?P<repair_verify>Verifying\ repair)
+    | (?P<validation>Running\ Extended\ Validation)
+    | Pause\ for\ (?P<pause>\d+)\ seconds
+    | (?P<hold>Paused\ at\ phase\ boundary|Suspended\ agent\ processes)
+    | Resumed\ after\ (?P<resume>\d+)\ seconds
+""", re.VERBOSE)
+
+# Notification level for plain lines and for events whose kind does not imply one
+LEVEL_PATTERN = re.compile(r"(?P<error>ERROR|FAILED)|(?P<success>SUCCESS)|(?P<milestone>MILESTONE)")
+
+_KINDS_BY_GROUP = {
+    "loop_total": LOOP_START,
+    "phase_total": PHASE_START,
+    "build_success": BUILD_SUCCESS,
+    "build_failed": BUILD_FAILED,
+    "repair_success": REPAIR_SUCCESS,
+    "repair_failed": REPAIR_FAILED,
+    "milestone": MILESTONE,
+    "checkpoint": CHECKPOINT,
+    "commit": COMMIT,
+    "build_check": BUILD_CHECK,
+    "repair_verify": REPAIR_VERIFY,
+    "validation": VALIDATION,
+    "pause": PAUSE,
+    "hold": HOLD,
+    "resume": RESUME
+}
+
+_LEVELS = {
+    BUILD_SUCCESS: "success",
+    BUILD_FAILED: "error",
+    REPAIR_SUCCESS: "success",
+    REPAIR_FAILED: "error",
+    MILESTONE: "milestone"
+}
+
+
+def _level(line):
+    found = LEVEL_PATTERN.search(line)
+    return found.lastgroup if found is not None else None
+
+
+def classify(line):
+    """Return the LogEvent for a line, or None for plain output.
+
+    The level comes from the event kind where that decides it (build and
+    repair results, milestones, checkpoints) and otherwise from any
+    ERROR/FAILED/SUCCESS/MILESTONE on the line - also for plain output, which
+    then comes back as a LogEvent with kind None.
+    """
+    match = EVENT_PATTERN.search(line)
+    if match is None:
+        level = _level(line)
+        if level is None:
+            return None
+        return LogEvent(None, None, None, None, level)
+
+    kind = _KINDS_BY_GROUP[match.lastgroup]
+    if kind == LOOP_START:
+        return LogEvent(kind, int(match.group("loop")), int(match.group("loop_total")), None, _level(line))
+    if kind == PHASE_START:
+        return LogEvent(kind, int(match.group("phase")), int(match.group("phase_total")), None, _level(line))
+    if kind == MILESTONE:
+        return LogEvent(kind, int(match.group("milestone")), None, None, "milestone")
+    if kind == PAUSE:
+        return LogEvent(kind, int(match.group("pause")), None, None, _level(line))
+    if kind == RESUME:
+        return LogEvent(kind, int(match.group("resume")), None, None, _level(line))
+    if kind == CHECKPOINT:
+        passed = match.group("checkpoint") == "PASSED"
+        return LogEvent(kind, None, None, "passed" if passed else "failed",
+                        "success" if passed else "error")
+    return LogEvent(kind, None, None, None, _LEVELS.get(kind) or _level(line))
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Git statistics
+Serves commits and diffstats from memory until HEAD or the refs change
+"""
+
+import os
+import re
+import sqlite3
+import subprocess
+import threading
+import time
+
+SHORTSTAT_PATTERN = re.compile(r'(\d+) files? changed(?:, (\d+) insertions?\(\+\))?(?:, (\d+) deletions?\(-\))?')
+
+
+def relative_date(timestamp, now=None):
+    """Format a unix timestamp like git's %ar ("5 minutes ago")"""
+    seconds = max(int((now or time.time()) - timestamp), 0)
+    for unit, size in (("year", 31536000), ("month", 2592000), ("week", 604800),
+                       ("day", 86400), ("hour", 3600), ("minute", 60)):
+        if seconds >= size * (2 if unit in ("year", "month") else 1):
+            count = seconds // size
+            return f"{count} {unit}{'s' if count != 1 else ''} ago"
+    return f"{seconds} second{'s' if seconds != 1 else ''} ago"
+
+
+class GitStats:
+    """Commit list and diffstat cache keyed by the current HEAD sha.
+
+    Change detection is a handful of stat() calls on .git/HEAD, the current
+    branch ref and packed-refs; git is only forked when one of them moved and
+    HEAD really points somewhere new. In a linked worktree HEAD is its own
+    but refs and packed-refs live in the main repository's common dir.
+    """
+
+    def __init__(self, repo_dir=None, diff_depth=10):
+        self.repo_dir = repo_dir or os.getcwd()
+        self.git_dir = self._find_git_dir()
+        self.common_dir = self._find_common_dir()
+        self.diff_depth = diff_depth
+        self.lock = threading.Lock()
+        self.signature = None
+        self.ref_path = None
+        self.head = None
+        self._commits = []
+        self._commits_limit = 0
+        self._diffstat = None
+
+    def _find_git_dir(self):
+        git_path = os.path.join(self.repo_dir, '.git')
+        if os.path.isfile(git_path):
+            # Worktrees and submodules: ".git" is a "gitdir: <path>" pointer
+            with open(git_path, 'r') as f:
+                pointer = f.read().strip()
+            if pointer.startswith('gitdir:'):
+                return os.path.join(self.repo_dir, pointer[len('gitdir:'):].strip())
+        return git_path
+
+    def _find_common_dir(self):
+        try:
+            with open(os.path.join(self.git_dir, 'commondir'), 'r') as f:
+                common = f.read().strip()
+        except OSError:
+            return self.git_dir
+        # Usually relative to the worktree's git dir ("../..")
+        return os.path.normpath(os.path.join(self.git_dir, common))
+
+    def _git(self, *args):
+        result = subprocess.run(
+            ['git', *args],
+            capture_output=True,
+            text=True,
+            cwd=self.repo_dir
+        )
+        return result.stdout
+
+    def _read_head(self):
+        """Resolve HEAD to (sha, ref file) from .git without forking"""
+        with open(os.path.join(self.git_dir, 'HEAD'), 'r') as f:
+            head = f.read().strip()
+        if not head.startswith('ref:'):
+            return head, None
+
+        ref = head[len('ref:'):].strip()
+        ref_path = os.path.join(self.common_dir, ref)
+        if os.path.exists(ref_path):
+            with open(ref_path, 'r') as f:
+                return f.read().strip(), ref_path
+
+        packed = os.path.join(self.common_dir, 'packed-refs')
+        if os.path.exists(packed):
+            with open(packed, 'r') as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1] == ref:
+                        return parts[0], ref_path
+        return None, ref_path
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            return None
+
+    def _signature(self):
+        paths = [os.path.join(self.git_dir, 'HEAD'), os.path.join(self.common_dir, 'packed-refs')]
+        if self.ref_path:
+            paths.append(self.ref_path)
+        return tuple(self._stat(path) for path in paths)
+
+    def _refresh(self):
+        """Drop cached results if HEAD moved; caller holds the lock"""
+        if self.signature is not None and self._signature() == self.signature:
+            return
+
+        try:
+            sha, self.ref_path = self._read_head()
+        except OSError:
+            sha, self.ref_path = None, None
+        self.signature = self._signature()
+
+        if sha != self.head:
+            self.head = sha
+            self._commits = []
+            self._commits_limit = 0
+            self._diffstat = None
+
+    def current_head(self):
+        """Current HEAD sha (None outside a repository)"""
+        with self.lock:
+            self._refresh()
+            return self.head
+
+    def commits(self, limit=20):
+        """Most recent commits as dicts with hash, author, date and message"""
+        with self.lock:
+            self._refresh()
+            if self.head is not None and limit > self._commits_limit:
+                commits = []
+                output = self._git('log', f'-{limit}', '--pretty=format:%h|%an|%at|%s')
+                for line in output.strip().split('\n'):
+                    parts = line.split('|')
+                    if len(parts) >= 4:
+                        commits.append({
+                            'hash': parts[0],
+                            'author': parts[1],
+                            'timestamp': int(parts[2]),
+                            'message': '|'.join(parts[3:])
+                        })
+                self._commits = commits
+                self._commits_limit = limit
+            cached = self._commits[:limit]
+
+        now = time.time()
+        return [
+            {
+                'hash': commit['hash'],
+                'author': commit['author'],
+                'date': relative_date(commit['timestamp'], now),
+                'message': commit['message']
+            }
+            for commit in cached
+        ]
+
+    def diffstat(self):
+        """files_changed / lines_added / lines_removed over the last `diff_depth` commits"""
+        with self.lock:
+            self._refresh()
+            if self._diffstat is None:
+                stats = {"files_changed": 0, "lines_added": 0, "lines_removed": 0}
+                if self.head is not None:
+                    shortstat = self._git('diff', '--shortstat', f'HEAD~{self.diff_depth}', 'HEAD')
+                    match = SHORTSTAT_PATTERN.search(shortstat)
+                    if match:
+                        stats["files_changed"] = int(match.group(1))
+                        stats["lines_added"] = int(match.group(2) or 0)
+                        stats["lines_removed"] = int(match.group(3) or 0)
+                self._diffstat = stats
+            return dict(self._diffstat)
+
+
+# ==========================================
+# PERSISTENT COMMIT INDEX
+# ==========================================
+
+PHASE_COMMIT_PATTERN = re.compile(r'Loop (\d+)/Phase (\d+)')
+REPAIR_COMMIT_MARKER = 'Auto-Repair'
+# git prints %x00 as a NUL byte, which never appears in numstat output
+NUMSTAT_MARKER = '\x00'
+
+
+class CommitIndex:
+    """Per-commit diffstats stored in SQLite and extended as new commits appear.
+
+    Phase commits ("Loop i/Phase n: ...") are keyed by loop and phase. An
+    emergency repair commit carries the phase's changes (the phase commit that
+    follows it is empty), so it is attributed to the next phase commit.
+    """
+
+    def __init__(self, db_path, repo_dir=None):
+        self.repo_dir = repo_dir or os.getcwd()
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(db_path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS commits (
+                sha TEXT PRIMARY KEY,
+                timestamp INTEGER NOT NULL,
+                message TEXT NOT NULL,
+                loop INTEGER,
+                phase INTEGER,
+                repair INTEGER NOT NULL DEFAULT 0,
+                files_changed INTEGER NOT NULL,
+                lines_added INTEGER NOT NULL,
+                lines_removed INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS commits_loop_phase ON commits (loop, phase);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self.db.commit()
+
+    def _git(self, *args):
+        result = subprocess.run(
+            ['git', *args],
+            capture_output=True,
+            text=True,
+            cwd=self.repo_dir
+        )
+        return result.returncode, result.stdout
+
+    def _indexed_head(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'head'").fetchone()
+        return row[0] if row else None
+
+    def update(self, head):
+        """Index commits reachable from `head` that are not indexed yet"""
+        with self.lock:
+            last = self._indexed_head()
+            if head is None or head == last:
+                return 0
+
+            revs = [head]
+            if last and self._git('merge-base', '--is-ancestor', last, head)[0] == 0:
+                revs.append(f'^{last}')
+            # Oldest first, so repair commits meet the phase commit that follows them
+            code, output = self._git('log', '--reverse', '--numstat',
+                                     '--format=%x00%H|%at|%s', *revs)
+            if code != 0:
+                return 0
+
+            added = 0
+            for block in output.split(NUMSTAT_MARKER)[1:]:
+                header, _, numstat = block.partition('\n')
+                sha, timestamp, message = header.split('|', 2)
+                files = lines_added = lines_removed = 0
+                for row in numstat.splitlines():
+                    parts = row.split('\t')
+                    if len(parts) == 3:
+                        files += 1
+                        # Binary files show "-" instead of line counts
+                        lines_added += int(parts[0]) if parts[0].isdigit() else 0
+                        lines_removed += int(parts[1]) if parts[1].isdigit() else 0
+
+                match = PHASE_COMMIT_PATTERN.search(message)
+                loop, phase = (int(match.group(1)), int(match.group(2))) if match else (None, None)
+                cursor = self.db.execute(
+                    "INSERT OR IGNORE INTO commits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (sha, int(timestamp), message, loop, phase,
+                     int(REPAIR_COMMIT_MARKER in message), files, lines_added, lines_removed)
+                )
+                added += cursor.rowcount
+                if match:
+                    self.db.execute(
+                        "UPDATE commits SET loop = ?, phase = ? WHERE repair = 1 AND loop IS NULL",
+                        (loop, phase)
+                    )
+
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('head', ?)", (head,))
+            self.db.commit()
+            return added
+
+    def churn(self, by="loop", loop=None, since=None):
+        """Aggregate commits and line churn per loop, or per (loop, phase).
+
+        Loop numbers restart with every run; pass `since` (unix time) to look
+        at a single run.
+        """
+        columns = "loop" if by == "loop" else "loop, phase"
+        where = "loop IS NOT NULL"
+        params = []
+        if loop is not None:
+            where += " AND loop = ?"
+            params.append(loop)
+        if since is not None:
+            where += " AND timestamp >= ?"
+            params.append(since)
+
+        with self.lock:
+            rows = self.db.execute(f"""
+                SELECT {columns}, COUNT(*), SUM(files_changed), SUM(lines_added), SUM(lines_removed)
+                FROM commits WHERE {where}
+                GROUP BY {columns} ORDER BY {columns}
+            """, params).fetchall()
+
+        keys = columns.split(', ') + ["commits", "files_changed", "lines_added", "lines_removed"]
+        return [dict(zip(keys, row)) for row in rows]
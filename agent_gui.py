@@ -4,22 +4,35 @@ Scalesite Agent GUI - Web-based Control Panel
 Provides a beautiful web interface to control the autonomous development loop
 """
 
+# First import: in gevent server mode this monkey-patches the standard library
+from agent_server import SERVER_MODE, capacity, run_native, serve
+
+import asyncio
+import atexit
 import os
 import sys
 import json
-import subprocess
+import queue
+import tempfile
 import threading
-import time
 from datetime import datetime
 from pathlib import Path
 from flask import Flask, render_template_string, jsonify, request, Response
 from flask_cors import CORS
 
+from agent_builds import BuildCache, BuildWorker
+from agent_events import BUILD_SUCCESS, PHASE_NAMES, REPAIR_FAILED
+from agent_http import StaticAsset, finalize_json
+from agent_logs import LineIndex, LogWatcher, tail_file
+from agent_metrics import LogMetrics, MetricsIngester, SnapshotCache
+from agent_orchestrator import Orchestrator
+
 app = Flask(__name__)
 CORS(app)
 
 # Global state
-agent_process = None
+orchestrator = None
+agent_thread = None
 agent_running = False
 agent_paused = False
 config = {
@@ -28,36 +41,62 @@ config = {
     "checkpoint_interval": 4,
     "milestone_interval": 5,
     "enable_html_report": True,
-    "max_failed_repairs": 5
+    "max_failed_repairs": 5,
+    "enable_build_cache": True,
+    "enable_build_worker": True,
+    "enable_typecheck": None,
+    "parallel_phases": 1,
+    "repair_candidates": 1,
+    "adaptive_pause": True,
+    "metrics_ttl": 2.0
 }
 
+# Seconds /api/stop waits for the run to wind down before answering
+STOP_TIMEOUT = 10
+
 # Paths
 LOG_FILE = "agent.log"
 ERROR_LOG_FILE = "agent_errors.log"
-METRICS_FILE = "agent_metrics.json"
+METRICS_FILE = "agent_metrics.jsonl"
 CONFIG_FILE = "agent_config.json"
+BUILD_CACHE_FILE = "agent_builds.db"
+BUILD_WORKER_SOCKET = os.path.join(tempfile.gettempdir(), f"scalesite-build-{os.getpid()}.sock")
+
+# Incremental log counters, shared across requests
+log_metrics = LogMetrics(LOG_FILE)
+
+# Structured events written by log_metric in the orchestrator
+metrics_ingester = MetricsIngester(METRICS_FILE)
+
+# Sparse line index for paging through agent.log history
+log_index = LineIndex(LOG_FILE)
+
+# One watcher thread feeds every /api/logs/stream client
+log_watcher = LogWatcher(LOG_FILE)
+
+# Page shell, rendered and compressed once on the first request
+page_shell = None
+
+# Build results keyed by working tree + lockfile, shared across runs
+build_cache = BuildCache(BUILD_CACHE_FILE)
+
+# Warm vite process shared by the orchestrator and /api/build, stopped on exit
+build_worker = BuildWorker(BUILD_WORKER_SOCKET)
+atexit.register(build_worker.stop)
 
 # Load config if exists
 if os.path.exists(CONFIG_FILE):
     with open(CONFIG_FILE, 'r') as f:
         config = json.load(f)
 
+# get_metrics() runs at most once per metrics_ttl, however many clients poll
+metrics_cache = SnapshotCache(lambda: get_metrics(), ttl=config.get("metrics_ttl", 2.0))
+
 def save_config():
     """Save current config to file"""
     with open(CONFIG_FILE, 'w') as f:
         json.dump(config, f, indent=2)
 
-def tail_file(filename, num_lines=50):
-    """Tail last N lines of a file"""
-    if not os.path.exists(filename):
-        return []
-    try:
-        with open(filename, 'r') as f:
-            lines = f.readlines()
-            return lines[-num_lines:]
-    except:
-        return []
-
 def get_metrics():
     """Parse metrics from JSON file"""
     if not os.path.exists(METRICS_FILE):
@@ -93,105 +132,89 @@ def get_metrics():
             "milestones": []
         }
 
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, 'r') as f:
-                content = f.read()
+        snapshot = log_metrics.poll()
+        counts = snapshot["counts"]
+
+        # Count successful phases
+        stats["successful_phases"] = counts[BUILD_SUCCESS]
+
+        # Count phase starts per phase type
+        for number, count in snapshot["phase_counts"].items():
+            name = PHASE_NAMES.get(number)
+            if name in stats["phase_breakdown"]:
+                stats["phase_breakdown"][name] = count
 
-                # Count successful phases
-                stats["successful_phases"] = content.count("Build SUCCESS")
+        stats["total_phases"] = sum(stats["phase_breakdown"].values())
 
-                # Count phase types (approximate)
-                stats["phase_breakdown"]["qa"] = content.count("Phase 1: QA")
-                stats["phase_breakdown"]["design"] = content.count("Phase 2: UI/UX")
-                stats["phase_breakdown"]["performance"] = content.count("Phase 3: Performance")
-                stats["phase_breakdown"]["security"] = content.count("Phase 4: Security")
-                stats["phase_breakdown"]["cleanup"] = content.count("Phase 5: Cleanup")
+        # Count failures
+        stats["failed_repairs"] = counts[REPAIR_FAILED]
 
-                stats["total_phases"] = sum(stats["phase_breakdown"].values())
+        stats["checkpoints"] = snapshot["checkpoints"]
+        stats["milestones"] = snapshot["milestones"]
 
-                # Count failures
-                stats["failed_repairs"] = content.count("Repair FAILED")
+        # Structured events (current run) take precedence over log scraping
+        events = metrics_ingester.poll()
+        series = events["series"]
+        if events["totals"]:
+            stats["failed_repairs"] = events["totals"].get("repair_failed", 0)
+            stats["repairs_succeeded"] = events["totals"].get("repair_success", 0)
+            stats["checkpoints"] = [point["value"] for point in series.get("checkpoint", [])]
+            stats["milestones"] = [point["value"] for point in series.get("milestone", [])]
+        stats["events"] = series
 
         return stats
     except Exception as e:
         print(f"Error parsing metrics: {e}")
         return {"error": str(e)}
 
-def generate_fish_script():
-    """Generate Claude.fish with current config"""
-    # Read the template
-    with open("Claude.fish", 'r') as f:
-        script = f.read()
-
-    # Replace config values
-    script = script.replace(
-        "set MAX_LOOPS 20",
-        f"set MAX_LOOPS {config['max_loops']}"
-    )
-    script = script.replace(
-        "set PAUSE_SECONDS 240",
-        f"set PAUSE_SECONDS {config['pause_seconds']}"
-    )
-    script = script.replace(
-        "set CHECKPOINT_INTERVAL 4",
-        f"set CHECKPOINT_INTERVAL {config['checkpoint_interval']}"
-    )
-    script = script.replace(
-        "set MILESTONE_INTERVAL 5",
-        f"set MILESTONE_INTERVAL {config['milestone_interval']}"
-    )
-    script = script.replace(
-        "set MAX_FAILED_REPAIRS 5",
-        f"set MAX_FAILED_REPAIRS {config['max_failed_repairs']}"
-    )
-    script = script.replace(
-        "set ENABLE_HTML_REPORT true",
-        f"set ENABLE_HTML_REPORT {str(config['enable_html_report']).lower()}"
-    )
-
-    # Write configured script
-    with open("Claude_configured.fish", 'w') as f:
-        f.write(script)
-
-    return "Claude_configured.fish"
+def run_orchestrator(orchestrator):
+    """One run on its own event loop; None if it was stopped via /api/stop"""
+    try:
+        return asyncio.run(orchestrator.run())
+    except asyncio.CancelledError:
+        return None
 
 def run_agent():
-    """Run the agent in a subprocess"""
-    global agent_process, agent_running
+    """Run the five-phase loop on the asyncio orchestrator"""
+    global orchestrator, agent_running
 
     try:
-        # Generate configured script
-        script_path = generate_fish_script()
-
-        # Run fish script
-        agent_process = subprocess.Popen(
-            ["fish", script_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
-        )
-
+        orchestrator = Orchestrator(config, build_cache=build_cache, build_worker=build_worker)
         agent_running = True
 
-        # Wait for completion
-        agent_process.wait()
-        agent_running = False
-        agent_process = None
+        # Output goes to agent.log, which the log endpoints already follow.
+        # In gevent mode the loop needs an OS thread of its own (run_native).
+        run_native(run_orchestrator, orchestrator)
 
     except Exception as e:
         print(f"Error running agent: {e}")
+
+    finally:
+        # Only now are the run's process groups gone; a new run may start
         agent_running = False
-        agent_process = None
+        orchestrator = None
 
 # ==========================================
 # ROUTES
 # ==========================================
 
+@app.after_request
+def cache_json(response):
+    """Content-hash ETag, 304 on If-None-Match, and compression for JSON responses"""
+    return finalize_json(response, request.headers.get('If-None-Match'), request.headers.get('Accept-Encoding'))
+
 @app.route('/')
 def index():
     """Serve the main GUI"""
-    return render_template_string(HTML_TEMPLATE)
+    global page_shell
+
+    if page_shell is None:
+        html = render_template_string(HTML_TEMPLATE)
+        page_shell = StaticAsset(html.encode('utf-8'), 'text/html; charset=utf-8')
+    status, headers, body = page_shell.select(
+        request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match')
+    )
+    return Response(body, status=status, headers=headers)
 
 @app.route('/api/config', methods=['GET', 'POST'])
 def api_config():
@@ -209,30 +232,30 @@ def api_config():
 @app.route('/api/start', methods=['POST'])
 def api_start():
     """Start the agent"""
-    global agent_running, agent_process
+    global agent_thread
 
-    if agent_running:
+    if agent_running or (agent_thread is not None and agent_thread.is_alive()):
         return jsonify({"status": "error", "message": "Agent already running"})
 
     # Start agent in thread
-    thread = threading.Thread(target=run_agent, daemon=True)
-    thread.start()
+    agent_thread = threading.Thread(target=run_agent, daemon=True)
+    agent_thread.start()
 
     return jsonify({"status": "success", "message": "Agent started"})
 
 @app.route('/api/stop', methods=['POST'])
 def api_stop():
     """Stop the agent"""
-    global agent_running, agent_process
-
-    if not agent_running or agent_process is None:
+    if not agent_running or orchestrator is None:
         return jsonify({"status": "error", "message": "Agent not running"})
 
     try:
-        agent_process.terminate()
-        agent_process.wait(timeout=5)
-        agent_running = False
-        agent_process = None
+        # Cancels the run; the orchestrator terminates its process groups and
+        # run_agent clears the state once they are gone
+        orchestrator.stop()
+        agent_thread.join(timeout=STOP_TIMEOUT)
+        if agent_thread.is_alive():
+            return jsonify({"status": "success", "message": "Agent stopping"})
         return jsonify({"status": "success", "message": "Agent stopped"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)})
@@ -248,7 +271,17 @@ def api_status():
 
 @app.route('/api/logs')
 def api_logs():
-    """Get recent logs"""
+    """Get recent logs, or a page of history with ?from_line=N&limit=M"""
+    if 'from_line' in request.args:
+        from_line = request.args.get('from_line', 0, type=int)
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        lines, total = log_index.read_lines(from_line, limit)
+        return jsonify({
+            "logs": lines,
+            "from_line": from_line,
+            "total_lines": total
+        })
+
     logs = tail_file(LOG_FILE, 100)
     errors = tail_file(ERROR_LOG_FILE, 50)
 
@@ -260,24 +293,36 @@ def api_logs():
 @app.route('/api/metrics')
 def api_metrics():
     """Get current metrics"""
-    return jsonify(get_metrics())
+    return jsonify(metrics_cache.get())
+
+@app.route('/api/metrics/cache')
+def api_metrics_cache():
+    """Hit/miss counters of the shared metrics snapshot"""
+    return jsonify(metrics_cache.stats())
 
 @app.route('/api/logs/stream')
 def api_logs_stream():
-    """Stream logs in real-time (SSE)"""
-    def generate():
-        last_position = 0
-        while True:
-            if os.path.exists(LOG_FILE):
-                with open(LOG_FILE, 'r') as f:
-                    f.seek(last_position)
-                    new_lines = f.readlines()
-                    last_position = f.tell()
+    """Stream logs in real-time (SSE), resuming after Last-Event-ID"""
+    since = request.headers.get('Last-Event-ID', 0, type=int)
+    subscription = log_watcher.subscribe(since)
 
-                    for line in new_lines:
-                        yield f"data: {json.dumps({'log': line})}\n\n"
-
-            time.sleep(1)
+    def generate():
+        try:
+            while True:
+                try:
+                    item = subscription.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+
+                # None: this client fell behind and should reconnect
+                if item is None:
+                    return
+
+                offset, line = item
+                yield f"id: {offset}\ndata: {json.dumps({'log': line})}\n\n"
+        finally:
+            log_watcher.unsubscribe(subscription)
 
     return Response(generate(), mimetype='text/event-stream')
 
@@ -955,10 +1000,14 @@ if __name__ == '__main__':
     print("⚙️  Configuration file: agent_config.json")
     print("📄 Logs: agent.log")
     print("❌ Error logs: agent_errors.log")
-    print("📊 Metrics: agent_metrics.json")
+    print("📊 Metrics: agent_metrics.jsonl")
     print()
+    if SERVER_MODE == "gevent":
+        print(f"🔌 Server: gevent, up to {capacity()} concurrent connections")
+    else:
+        print("🔌 Server: threaded (AGENT_SERVER_MODE=gevent for many clients)")
     print("Press Ctrl+C to stop the server")
     print("=" * 60)
     print()
 
-    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
+    serve(app, host='0.0.0.0', port=5000)
@@ -4,33 +4,47 @@ Scalesite Agent GUI Ultimate - Advanced Web Control Panel
 Real-time streaming, charts, notifications, pause/resume, and much more!
 """
 
+# First import: in gevent server mode this monkey-patches the standard library
+from agent_server import SERVER_MODE, capacity, serve
+
+import atexit
 import os
 import sys
 import json
-import subprocess
-import threading
+import tempfile
 import time
-import signal
 from datetime import datetime
 from pathlib import Path
 from flask import Flask, render_template_string, jsonify, request, Response, send_file
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
 
+from agent_builds import BuildCache, BuildWorker
+from agent_events import (
+    BUILD_SUCCESS, COMMIT, LOOP_START, PHASE_NAMES, PHASE_START, REPAIR_FAILED, classify
+)
+from agent_git import CommitIndex, GitStats
+from agent_history import HistoryStore
+from agent_http import StaticAsset, finalize_json
+from agent_jobs import CANCELLED, DONE, FINISHED_STATES, QUEUED, JobScheduler
+from agent_metrics import LogMetrics, MetricsIngester, SnapshotCache
+from agent_pacing import PauseScheduler
+from agent_resources import ResourceSampler
+from agent_stream import CoalescingEmitter, DeltaPublisher, LineRing
+from agent_timings import PHASE, PhaseTimer
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'scalesite-agent-secret-2026'
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=SERVER_MODE)
 
 # Global state
-agent_process = None
-agent_thread = None
+orchestrator = None
+dashboard_job = None
 agent_running = False
 agent_paused = False
 current_loop = 0
 current_phase = 0
-pause_event = threading.Event()
-pause_event.set()  # Not paused initially
 
 config = {
     "max_loops": 20,
@@ -39,6 +53,16 @@ config = {
     "milestone_interval": 5,
     "enable_html_report": True,
     "max_failed_repairs": 5,
+    "enable_build_cache": True,
+    "enable_build_worker": True,
+    "enable_typecheck": None,
+    "parallel_phases": 1,
+    "repair_candidates": 1,
+    "adaptive_pause": True,
+    "max_jobs": 2,
+    "max_builds": 1,
+    "client_polling": False,
+    "metrics_ttl": 2.0,
     "enable_notifications": True,
     "enable_6th_phase": False  # Testing phase
 }
@@ -46,15 +70,78 @@ config = {
 # Paths
 LOG_FILE = "agent.log"
 ERROR_LOG_FILE = "agent_errors.log"
-METRICS_FILE = "agent_metrics.json"
+METRICS_FILE = "agent_metrics.jsonl"
 CONFIG_FILE = "agent_config.json"
-HISTORY_FILE = "agent_history.json"
+BUILD_CACHE_FILE = "agent_builds.db"
+BUILD_WORKER_SOCKET = os.path.join(tempfile.gettempdir(), f"scalesite-build-{os.getpid()}.sock")
+HISTORY_FILE = "agent_history.jsonl"
+LEGACY_HISTORY_FILE = "agent_history.json"
+COMMIT_INDEX_FILE = "agent_commits.db"
+
+# Incremental log counters, shared by HTTP and Socket.IO clients
+log_metrics = LogMetrics(LOG_FILE)
+
+# Structured events written by log_metric in the orchestrator
+metrics_ingester = MetricsIngester(METRICS_FILE)
+
+# Model/build/repair/pause latency histograms from the output stream
+phase_timer = PhaseTimer()
+
+# CPU/RSS/IO of the agent's process tree per loop and phase, while a run is active
+resource_sampler = ResourceSampler()
+
+# Commits and diffstats, recomputed only when HEAD or the refs change
+git_stats = GitStats()
+
+# Per-commit diffstats, persisted across runs and filled as commits appear
+commit_index = CommitIndex(COMMIT_INDEX_FILE)
+
+# Append-only run history (imports the old agent_history.json once)
+history_store = HistoryStore(HISTORY_FILE, legacy_path=LEGACY_HISTORY_FILE)
+
+# Agent output is sent to clients in frames of up to 200 lines / 100 ms
+log_emitter = CoalescingEmitter(socketio.emit, interval=0.1, max_lines=200)
+
+# The orchestrator only appends output here; a worker thread runs
+# handle_output_line, so notifications and emits never stall the agent
+output_ring = LineRing(lambda line: handle_output_line(line), capacity=20000)
+
+# Page shell, rendered and compressed once on the first request
+page_shell = None
+
+# One metrics/status snapshot, pushed to every client as versioned patches
+metrics_publisher = DeltaPublisher(
+    socketio.emit, lambda: {"metrics": metrics_cache.get(), "status": current_status()}
+)
+
+# Build results keyed by working tree + lockfile, shared across runs
+build_cache = BuildCache(BUILD_CACHE_FILE)
+
+# Warm vite process shared by the orchestrator and /api/build, stopped on exit
+build_worker = BuildWorker(BUILD_WORKER_SOCKET)
+atexit.register(build_worker.stop)
+
+# Inter-loop pauses and call pacing, adapted to rate-limit signals
+pause_scheduler = PauseScheduler()
 
 # Load config if exists
 if os.path.exists(CONFIG_FILE):
     with open(CONFIG_FILE, 'r') as f:
         config = json.load(f)
 
+# get_metrics() runs at most once per metrics_ttl (or per new event), however
+# many tabs and sockets ask; concurrent callers share one computation
+metrics_cache = SnapshotCache(lambda: get_metrics(), ttl=config.get("metrics_ttl", 2.0))
+
+# Queued runs for this and other project repos; limits are read at startup
+job_scheduler = JobScheduler(
+    max_running=config.get("max_jobs", 2),
+    max_builds=config.get("max_builds", 1),
+    build_cache=build_cache,
+    build_worker=build_worker,
+    on_change=lambda job: socketio.emit('job_update', job.to_dict())
+)
+
 def save_config():
     """Save current config to file"""
     with open(CONFIG_FILE, 'w') as f:
@@ -70,40 +157,10 @@ def emit_notification(title, message, type="info"):
             'timestamp': datetime.now().isoformat()
         })
 
-def tail_file(filename, num_lines=50):
-    """Tail last N lines of a file"""
-    if not os.path.exists(filename):
-        return []
-    try:
-        with open(filename, 'r') as f:
-            lines = f.readlines()
-            return lines[-num_lines:]
-    except:
-        return []
-
 def get_git_commits(limit=20):
-    """Get recent git commits"""
+    """Get recent git commits (cached until HEAD moves)"""
     try:
-        result = subprocess.run(
-            ['git', 'log', f'-{limit}', '--pretty=format:%h|%an|%ar|%s'],
-            capture_output=True,
-            text=True,
-            cwd=os.getcwd()
-        )
-
-        commits = []
-        for line in result.stdout.strip().split('\n'):
-            if line:
-                parts = line.split('|')
-                if len(parts) >= 4:
-                    commits.append({
-                        'hash': parts[0],
-                        'author': parts[1],
-                        'date': parts[2],
-                        'message': '|'.join(parts[3:])
-                    })
-
-        return commits
+        return git_stats.commits(limit)
     except Exception as e:
         print(f"Error getting git commits: {e}")
         return []
@@ -136,217 +193,181 @@ def get_metrics():
         }
     }
 
-    if os.path.exists(LOG_FILE):
-        try:
-            with open(LOG_FILE, 'r') as f:
-                content = f.read()
-
-                # Count successful phases
-                stats["successful_phases"] = content.count("Build SUCCESS")
-
-                # Count phase types
-                stats["phase_breakdown"]["qa"] = content.count("Phase 1")
-                stats["phase_breakdown"]["design"] = content.count("Phase 2")
-                stats["phase_breakdown"]["performance"] = content.count("Phase 3")
-                stats["phase_breakdown"]["security"] = content.count("Phase 4")
-                stats["phase_breakdown"]["cleanup"] = content.count("Phase 5")
-                stats["phase_breakdown"]["testing"] = content.count("Phase 6")
-
-                stats["total_phases"] = sum(stats["phase_breakdown"].values())
-
-                # Count failures
-                stats["failed_repairs"] = content.count("Repair FAILED")
-
-                # Extract current loop
-                import re
-                loop_matches = re.findall(r'LOOP (\d+) of (\d+)', content)
-                if loop_matches:
-                    last_match = loop_matches[-1]
-                    stats["current_loop"] = int(last_match[0])
-
-                # Count commits (approximate from log)
-                stats["commits"] = content.count("git commit")
-
-                # Get lines changed from git
-                try:
-                    result = subprocess.run(
-                        ['git', 'diff', '--shortstat', 'HEAD~10', 'HEAD'],
-                        capture_output=True,
-                        text=True,
-                        cwd=os.getcwd()
-                    )
-                    shortstat = result.stdout
-                    if 'insertion' in shortstat:
-                        insertions = re.search(r'(\d+) insertion', shortstat)
-                        if insertions:
-                            stats["lines_added"] = int(insertions.group(1))
-                    if 'deletion' in shortstat:
-                        deletions = re.search(r'(\d+) deletion', shortstat)
-                        if deletions:
-                            stats["lines_removed"] = int(deletions.group(1))
-                    if 'file' in shortstat:
-                        files = re.search(r'(\d+) file', shortstat)
-                        if files:
-                            stats["files_changed"] = int(files.group(1))
-                except:
-                    pass
+    try:
+        snapshot = log_metrics.poll()
+        counts = snapshot["counts"]
 
-        except Exception as e:
-            print(f"Error parsing metrics: {e}")
+        # Count successful phases
+        stats["successful_phases"] = counts[BUILD_SUCCESS]
 
-    return stats
+        # Count phase starts per phase type
+        for number, count in snapshot["phase_counts"].items():
+            name = PHASE_NAMES.get(number)
+            if name in stats["phase_breakdown"]:
+                stats["phase_breakdown"][name] = count
 
-def save_to_history():
-    """Save current run to history"""
-    history = []
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, 'r') as f:
-            history = json.load(f)
+        stats["total_phases"] = sum(stats["phase_breakdown"].values())
 
-    metrics = get_metrics()
-    history.append({
-        'timestamp': datetime.now().isoformat(),
-        'metrics': metrics,
-        'config': config.copy()
-    })
+        # Count failures
+        stats["failed_repairs"] = counts[REPAIR_FAILED]
 
-    # Keep only last 50 runs
-    history = history[-50:]
+        # Current loop (last "LOOP i of n" seen)
+        stats["current_loop"] = snapshot["current_loop"]
 
-    with open(HISTORY_FILE, 'w') as f:
-        json.dump(history, f, indent=2)
+        # Count commits (approximate from log)
+        stats["commits"] = counts[COMMIT]
 
-def generate_fish_script():
-    """Generate Claude.fish with current config"""
-    with open("Claude.fish", 'r') as f:
-        script = f.read()
+        stats["checkpoints"] = snapshot["checkpoints"]
+        stats["milestones"] = snapshot["milestones"]
 
-    # Replace config values
-    script = script.replace(
-        "set MAX_LOOPS 20",
-        f"set MAX_LOOPS {config['max_loops']}"
-    )
-    script = script.replace(
-        "set PAUSE_SECONDS 240",
-        f"set PAUSE_SECONDS {config['pause_seconds']}"
-    )
-    script = script.replace(
-        "set CHECKPOINT_INTERVAL 4",
-        f"set CHECKPOINT_INTERVAL {config['checkpoint_interval']}"
-    )
-    script = script.replace(
-        "set MILESTONE_INTERVAL 5",
-        f"set MILESTONE_INTERVAL {config['milestone_interval']}"
-    )
-    script = script.replace(
-        "set MAX_FAILED_REPAIRS 5",
-        f"set MAX_FAILED_REPAIRS {config['max_failed_repairs']}"
-    )
-    script = script.replace(
-        "set ENABLE_HTML_REPORT true",
-        f"set ENABLE_HTML_REPORT {str(config['enable_html_report']).lower()}"
-    )
-
-    # Write configured script
-    with open("Claude_configured.fish", 'w') as f:
-        f.write(script)
+        # Structured events (current run) take precedence over log scraping
+        events = metrics_ingester.poll()
+        series = events["series"]
+        if events["totals"]:
+            stats["failed_repairs"] = events["totals"].get("repair_failed", 0)
+            stats["repairs_succeeded"] = events["totals"].get("repair_success", 0)
+            stats["checkpoints"] = [point["value"] for point in series.get("checkpoint", [])]
+            stats["milestones"] = [point["value"] for point in series.get("milestone", [])]
+        stats["events"] = series
 
-    return "Claude_configured.fish"
+        # Phase timings derived from the live output stream
+        timings = phase_timer.snapshot()
+        stats["performance"]["avg_phase_time"] = timings["segments"].get(PHASE, {}).get("mean", 0)
+        stats["performance"]["total_runtime"] = timings["total_runtime"]
+        stats["performance"]["paused_total"] = timings["paused_total"]
+        stats["performance"]["segments"] = timings["segments"]
+        stats["performance"]["output_buffer"] = output_ring.stats()
 
-def stream_process_output(process):
-    """Stream process output via SocketIO"""
-    global current_loop, current_phase
+        # Waits chosen by the pause scheduler
+        stats["pacing"] = pause_scheduler.snapshot()
 
-    for line in iter(process.stdout.readline, ''):
-        if line:
-            # Extract loop and phase info
-            if 'LOOP' in line and 'of' in line:
-                import re
-                match = re.search(r'LOOP (\d+) of (\d+)', line)
-                if match:
-                    current_loop = int(match.group(1))
-
-            if 'Phase' in line:
-                import re
-                match = re.search(r'Phase (\d+)/(\d+)', line)
-                if match:
-                    current_phase = int(match.group(1))
-
-            # Emit log line
-            socketio.emit('log_line', {
-                'line': line,
-                'timestamp': datetime.now().isoformat()
-            })
-
-            # Emit progress
-            progress = (current_loop / config['max_loops']) * 100 if config['max_loops'] > 0 else 0
-            socketio.emit('progress_update', {
-                'loop': current_loop,
-                'phase': current_phase,
-                'progress': progress
-            })
-
-            # Check for important events and send notifications
-            if 'ERROR' in line or 'FAILED' in line:
-                emit_notification(
-                    '⚠️ Error Detected',
-                    line.strip()[:100],
-                    'error'
-                )
-            elif 'SUCCESS' in line or 'Checkpoint' in line and 'PASSED' in line:
-                emit_notification(
-                    '✅ Success',
-                    line.strip()[:100],
-                    'success'
-                )
-            elif 'MILESTONE' in line:
-                emit_notification(
-                    '🏆 Milestone Reached',
-                    line.strip()[:100],
-                    'success'
-                )
-
-def run_agent():
-    """Run the agent in a subprocess with real-time streaming"""
-    global agent_process, agent_running, current_loop, current_phase
+        # Latest resource sample plus per-phase totals (full series: /api/resources)
+        stats["resources"] = resource_sampler.snapshot(points=1)
 
-    try:
-        script_path = generate_fish_script()
+        # Get lines changed from git (cached until HEAD moves)
+        try:
+            stats.update(git_stats.diffstat())
+        except Exception as e:
+            print(f"Error getting git stats: {e}")
 
-        emit_notification('🚀 Agent Started', f'Running {config["max_loops"]} loops', 'info')
+    except Exception as e:
+        print(f"Error parsing metrics: {e}")
 
-        agent_process = subprocess.Popen(
-            ["fish", script_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            preexec_fn=os.setsid  # Create new process group
-        )
+    return stats
 
-        agent_running = True
+def current_status():
+    """Run state shared by /api/status and the metrics patches"""
+    return {
+        "running": agent_running,
+        "paused": agent_paused,
+        "pause": orchestrator.pause_status() if orchestrator else None,
+        "loop": current_loop,
+        "phase": current_phase,
+        "job": dashboard_job.to_dict() if dashboard_job else None
+    }
 
-        # Stream output
-        stream_process_output(agent_process)
+def save_to_history():
+    """Save current run to history"""
+    history_store.append({
+        'timestamp': datetime.now().isoformat(),
+        'metrics': get_metrics(),
+        'config': config.copy()
+    })
 
-        # Wait for completion
-        agent_process.wait()
+    # Optional compaction; history is unbounded unless a limit is configured
+    if config.get("history_max_runs"):
+        history_store.compact(config["history_max_runs"])
 
-        agent_running = False
-        agent_process = None
-        current_loop = 0
-        current_phase = 0
+def handle_output_line(line):
+    """Forward one line of orchestrator output to clients"""
+    global current_loop, current_phase
 
-        # Save to history
-        save_to_history()
+    # Classify once: loop/phase tracking and notifications share the event
+    event = classify(line)
+
+    phase_timer.observe(event)
+    resource_sampler.observe(event)
+    if event and event.kind:
+        metrics_cache.invalidate()
+        metrics_publisher.touch()
+
+    if event and event.kind == LOOP_START:
+        current_loop = event.number
+    elif event and event.kind == PHASE_START:
+        current_phase = event.number
+
+    # Queue log line (sent in batched frames)
+    log_emitter.push_line(line)
+
+    # Queue progress (only sent when loop or phase changes)
+    progress = (current_loop / config['max_loops']) * 100 if config['max_loops'] > 0 else 0
+    log_emitter.set_progress(current_loop, current_phase, progress)
+
+    # Check for important events and send notifications
+    level = event.level if event else None
+    if level == 'error':
+        emit_notification(
+            '⚠️ Error Detected',
+            line.strip()[:100],
+            'error'
+        )
+    elif level == 'success':
+        emit_notification(
+            '✅ Success',
+            line.strip()[:100],
+            'success'
+        )
+    elif level == 'milestone':
+        emit_notification(
+            '🏆 Milestone Reached',
+            line.strip()[:100],
+            'success'
+        )
 
+def on_agent_start(job):
+    """The dashboard run left the queue; route its output to the dashboard"""
+    global orchestrator, agent_running
+
+    orchestrator = job.orchestrator
+    agent_running = True
+    emit_notification('🚀 Agent Started', f'Running {job.config["max_loops"]} loops', 'info')
+    output_ring.start()
+    log_emitter.start()
+    phase_timer.start_run()
+    resource_sampler.start_run()
+    metrics_cache.invalidate()
+    metrics_publisher.touch()
+
+def on_agent_finish(job):
+    """Reset dashboard state once the run ends, however it ended"""
+    global orchestrator, agent_running, agent_paused, current_loop, current_phase
+
+    # Let the last lines reach the timers and clients before resetting
+    output_ring.drain()
+    phase_timer.end_run()
+    resource_sampler.end_run()
+    agent_running = False
+    agent_paused = False
+    orchestrator = None
+    current_loop = 0
+    current_phase = 0
+    metrics_cache.invalidate()
+    metrics_publisher.touch()
+
+    if job.status == CANCELLED:
+        # Stopped via /api/stop
+        return
+    if job.error:
+        emit_notification('❌ Agent Error', job.error, 'error')
+        return
+
+    # Save to history
+    save_to_history()
+
+    if job.status == DONE:
         emit_notification('🎉 Agent Completed', 'All loops finished successfully!', 'success')
-
-    except Exception as e:
-        print(f"Error running agent: {e}")
-        agent_running = False
-        agent_process = None
-        emit_notification('❌ Agent Error', str(e), 'error')
+    else:
+        emit_notification('❌ Agent Aborted', 'Run stopped early, see agent_errors.log', 'error')
 
 # ==========================================
 # SOCKET.IO EVENTS
@@ -355,29 +376,48 @@ def run_agent():
 @socketio.on('connect')
 def handle_connect():
     print('Client connected')
-    emit('status_update', {
-        'running': agent_running,
-        'paused': agent_paused,
-        'loop': current_loop,
-        'phase': current_phase
-    })
+    log_emitter.add_client(request.sid)
+    metrics_publisher.start()
+    metrics_publisher.add_client()
+    emit('status_update', current_status())
 
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Client disconnected')
+    log_emitter.remove_client(request.sid)
+    metrics_publisher.remove_client()
+
+@socketio.on('subscribe_metrics')
+def handle_subscribe_metrics(data=None):
+    """Catch a (re)connecting client up from the version it last applied"""
+    data = data or {}
+    emit('metrics_patch', metrics_publisher.catch_up(data.get('version', 0), data.get('epoch')))
 
 @socketio.on('request_metrics')
 def handle_request_metrics():
-    emit('metrics_update', get_metrics())
+    emit('metrics_update', metrics_publisher.catch_up(0)["full"]["metrics"])
 
 # ==========================================
 # ROUTES
 # ==========================================
 
+@app.after_request
+def cache_json(response):
+    """Content-hash ETag, 304 on If-None-Match, and compression for JSON responses"""
+    return finalize_json(response, request.headers.get('If-None-Match'), request.headers.get('Accept-Encoding'))
+
 @app.route('/')
 def index():
     """Serve the main GUI"""
-    return render_template_string(HTML_TEMPLATE)
+    global page_shell
+
+    if page_shell is None:
+        html = render_template_string(HTML_TEMPLATE)
+        page_shell = StaticAsset(html.encode('utf-8'), 'text/html; charset=utf-8')
+    status, headers, body = page_shell.select(
+        request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match')
+    )
+    return Response(body, status=status, headers=headers)
 
 @app.route('/api/config', methods=['GET', 'POST'])
 def api_config():
@@ -395,32 +435,34 @@ def api_config():
 
 @app.route('/api/start', methods=['POST'])
 def api_start():
-    """Start the agent"""
-    global agent_running, agent_thread
+    """Start the agent (queued behind other jobs if the limits are reached)"""
+    global dashboard_job
 
-    if agent_running:
+    if dashboard_job is not None and dashboard_job.status not in FINISHED_STATES:
         return jsonify({"status": "error", "message": "Agent already running"})
 
-    # Start agent in thread
-    agent_thread = threading.Thread(target=run_agent, daemon=True)
-    agent_thread.start()
+    priority = (request.get_json(silent=True) or {}).get("priority", 0)
+    dashboard_job = job_scheduler.submit(
+        os.getcwd(), config, priority=priority, pacer=pause_scheduler,
+        on_line=output_ring.push, on_start=on_agent_start, on_finish=on_agent_finish
+    )
 
-    return jsonify({"status": "success", "message": "Agent started"})
+    if dashboard_job.status == QUEUED:
+        return jsonify({"status": "success", "message": "Agent queued", "job": dashboard_job.id})
+    return jsonify({"status": "success", "message": "Agent started", "job": dashboard_job.id})
 
 @app.route('/api/stop', methods=['POST'])
 def api_stop():
     """Stop the agent"""
-    global agent_running, agent_process
-
-    if not agent_running or agent_process is None:
+    if dashboard_job is None or dashboard_job.status in FINISHED_STATES:
         return jsonify({"status": "error", "message": "Agent not running"})
 
     try:
-        # Send SIGTERM to process group
-        os.killpg(os.getpgid(agent_process.pid), signal.SIGTERM)
-        agent_process.wait(timeout=10)
-        agent_running = False
-        agent_process = None
+        # Cancels the run; the orchestrator terminates its process groups
+        # (continuing them first if they were suspended by a hard pause)
+        job_scheduler.cancel(dashboard_job.id)
+        if dashboard_job.thread is not None:
+            dashboard_job.thread.join(timeout=10)
         emit_notification('⏹️ Agent Stopped', 'Agent terminated by user', 'warning')
         return jsonify({"status": "success", "message": "Agent stopped"})
     except Exception as e:
@@ -431,12 +473,20 @@ def api_pause():
     """Pause the agent"""
     global agent_paused
 
-    if not agent_running:
+    if not agent_running or orchestrator is None:
         return jsonify({"status": "error", "message": "Agent not running"})
 
+    # soft: hold at the next phase boundary; hard: also SIGSTOP running processes
+    hard = (request.get_json(silent=True) or {}).get("mode", "soft") == "hard"
+    if not orchestrator.pause(hard=hard):
+        return jsonify({"status": "error", "message": "Agent is still starting"})
+
     agent_paused = True
-    pause_event.clear()
-    emit_notification('⏸️ Agent Paused', 'Agent execution paused', 'info')
+    metrics_publisher.touch()
+    if hard:
+        emit_notification('⏸️ Agent Suspended', 'Running processes stopped until resume', 'info')
+    else:
+        emit_notification('⏸️ Agent Pausing', 'Holding at the next phase boundary', 'info')
 
     return jsonify({"status": "success", "message": "Agent paused"})
 
@@ -445,11 +495,12 @@ def api_resume():
     """Resume the agent"""
     global agent_paused
 
-    if not agent_paused:
+    if not agent_paused or orchestrator is None:
         return jsonify({"status": "error", "message": "Agent not paused"})
 
+    orchestrator.resume()
     agent_paused = False
-    pause_event.set()
+    metrics_publisher.touch()
     emit_notification('▶️ Agent Resumed', 'Agent execution resumed', 'info')
 
     return jsonify({"status": "success", "message": "Agent resumed"})
@@ -457,36 +508,133 @@ def api_resume():
 @app.route('/api/status')
 def api_status():
     """Get current status"""
+    return jsonify({**current_status(), "config": config})
+
+@app.route('/api/jobs', methods=['GET', 'POST'])
+def api_jobs():
+    """All jobs with limits (GET), or queue a run for a project repo (POST)"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        repo = os.path.abspath(os.path.expanduser(data.get("repo", "")))
+        # A file, not a directory, in linked worktrees and submodules
+        if not os.path.exists(os.path.join(repo, '.git')):
+            return jsonify({"status": "error", "message": f"Not a git repository: {repo}"}), 400
+        job_config = {**config, **data.get("config", {})}
+        # One call budget for every run against the same API account
+        job = job_scheduler.submit(repo, job_config, priority=data.get("priority", 0),
+                                   pacer=pause_scheduler)
+        return jsonify({"status": "success", "job": job.to_dict()})
+
+    return jsonify(job_scheduler.status())
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET', 'DELETE'])
+def api_job(job_id):
+    """One job's status, metrics and last ?lines=N output lines; DELETE cancels it"""
+    job = job_scheduler.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown job"}), 404
+
+    if request.method == 'DELETE':
+        if not job_scheduler.cancel(job_id):
+            return jsonify({"status": "error", "message": "Job already finished"})
+        return jsonify({"status": "success", "job": job.to_dict()})
+
+    lines = request.args.get('lines', 100, type=int)
     return jsonify({
-        "running": agent_running,
-        "paused": agent_paused,
-        "loop": current_loop,
-        "phase": current_phase,
-        "config": config
+        **job.to_dict(),
+        "metrics": job.metrics(),
+        "lines": list(job.lines)[-lines:] if lines > 0 else []
     })
 
+@app.route('/api/jobs/<int:job_id>/<action>', methods=['POST'])
+def api_job_control(job_id, action):
+    """Pause (soft or hard, as in /api/pause) or resume one running job"""
+    job = job_scheduler.get(job_id)
+    job_orchestrator = job.orchestrator if job else None
+    if job_orchestrator is None or action not in ('pause', 'resume'):
+        return jsonify({"status": "error", "message": "Job not running"})
+
+    if action == 'pause':
+        hard = (request.get_json(silent=True) or {}).get("mode", "soft") == "hard"
+        if not job_orchestrator.pause(hard=hard):
+            return jsonify({"status": "error", "message": "Job is still starting"})
+    else:
+        job_orchestrator.resume()
+    return jsonify({"status": "success", "job": job.to_dict()})
+
 @app.route('/api/metrics')
 def api_metrics():
     """Get current metrics"""
-    return jsonify(get_metrics())
+    return jsonify(metrics_cache.get())
+
+@app.route('/api/metrics/cache')
+def api_metrics_cache():
+    """Hit/miss/shared counters of the metrics snapshot cache"""
+    return jsonify(metrics_cache.stats())
+
+@app.route('/api/timings')
+def api_timings():
+    """Per-segment and per-phase latency histograms (p50/p95/p99)"""
+    return jsonify(phase_timer.snapshot())
+
+@app.route('/api/pacing')
+def api_pacing():
+    """Call budget, rate-limit strikes and the last pause that was chosen"""
+    return jsonify(pause_scheduler.snapshot())
+
+@app.route('/api/resources')
+def api_resources():
+    """CPU, RSS, disk I/O and process count time series of the agent's process tree"""
+    return jsonify(resource_sampler.snapshot(points=request.args.get('points', type=int)))
+
+@app.route('/api/build', methods=['GET', 'POST'])
+def api_build():
+    """Warm build worker status, or run a build in it (POST)"""
+    if request.method == 'POST':
+        if not build_worker.supports(os.getcwd()):
+            return jsonify({"status": "error", "message": "Build script is not a plain `vite build`"})
+        result = build_worker.build(os.getcwd())
+        if result is None:
+            return jsonify({"status": "error", "message": "Build worker unavailable"})
+        return jsonify({"status": "success", "result": result})
+
+    return jsonify({**build_worker.status(), "cache": build_cache.stats()})
 
 @app.route('/api/commits')
 def api_commits():
     """Get recent git commits"""
     return jsonify(get_git_commits(30))
 
+@app.route('/api/churn')
+def api_churn():
+    """Per-loop (?by=loop) or per-phase (?by=phase) churn from the commit index"""
+    try:
+        commit_index.update(git_stats.current_head())
+        return jsonify(commit_index.churn(
+            by=request.args.get('by', 'loop'),
+            loop=request.args.get('loop', type=int),
+            since=request.args.get('since', type=int)
+        ))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/history')
 def api_history():
-    """Get run history"""
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, 'r') as f:
-            return jsonify(json.load(f))
-    return jsonify([])
+    """Get run history: last ?limit=N runs, or runs ?since=<ISO date>"""
+    limit = request.args.get('limit', 50, type=int)
+    since = request.args.get('since')
+
+    if since:
+        try:
+            return jsonify(history_store.since(datetime.fromisoformat(since), limit))
+        except ValueError:
+            return jsonify({"error": "since must be an ISO date"}), 400
+    return jsonify(history_store.last(limit))
 
 @app.route('/api/export/<format>')
 def api_export(format):
     """Export data in various formats"""
-    metrics = get_metrics()
+    metrics = metrics_cache.get()
 
     if format == 'json':
         return jsonify(metrics)
@@ -986,7 +1134,7 @@ HTML_TEMPLATE = '''
                 </div>
 
                 <div class="config-group">
-                    <label class="config-label">Pause (seconds)</label>
+                    <label class="config-label">Pause / Backoff Base (seconds)</label>
                     <input type="number" class="config-input" id="pauseSeconds" value="240" min="30" max="600">
                 </div>
 
@@ -1030,6 +1178,13 @@ HTML_TEMPLATE = '''
 
                 <button class="btn btn-primary" id="startBtn" onclick="startAgent()">▶️ Start Agent</button>
 
+                <div class="config-group">
+                    <div class="checkbox-wrapper">
+                        <input type="checkbox" id="hardPause">
+                        <label class="config-label" style="margin: 0">Hard Pause (suspend running processes)</label>
+                    </div>
+                </div>
+
                 <div class="btn-group">
                     <button class="btn btn-warning" id="pauseBtn" onclick="pauseAgent()" disabled>⏸️ Pause</button>
                     <button class="btn btn-warning" id="resumeBtn" onclick="resumeAgent()" disabled style="display:none">▶️ Resume</button>
@@ -1078,6 +1233,11 @@ HTML_TEMPLATE = '''
                         <div class="metric-value success" id="linesAdded">+0</div>
                         <div class="metric-value error" id="linesRemoved" style="font-size: 18px; margin-top: 4px;">-0</div>
                     </div>
+                    <div class="metric-card">
+                        <div class="metric-label">Last Pause</div>
+                        <div class="metric-value" id="lastPause">-</div>
+                        <div class="metric-label" id="pauseReason" style="margin-top: 4px;">no pauses yet</div>
+                    </div>
                 </div>
 
                 <div class="card-title" style="margin-top: 24px">📦 Phase Breakdown</div>
@@ -1147,18 +1307,25 @@ HTML_TEMPLATE = '''
 
         let performanceChart = null;
         let phaseData = [];
+        let cpuData = [];
+        let rssData = [];
+        let metricsState = null;
+        let metricsVersion = 0;
+        let metricsEpoch = null;
+        let pollTimers = null;
 
         // Socket.IO event handlers
         socket.on('connect', () => {
             console.log('Connected to server');
             loadConfig();
-            updateStatus();
-            updateMetrics();
+            // Full state on first connect, only what was missed on a reconnect
+            socket.emit('subscribe_metrics', { version: metricsVersion, epoch: metricsEpoch });
             loadCommits();
         });
 
-        socket.on('log_line', (data) => {
-            appendToTerminal(data.line);
+        socket.on('log_lines', (data, ack) => {
+            appendToTerminal(data.lines);
+            if (ack) ack();
         });
 
         socket.on('progress_update', (data) => {
@@ -1173,6 +1340,22 @@ HTML_TEMPLATE = '''
             displayMetrics(data);
         });
 
+        socket.on('metrics_patch', (data) => {
+            if (data.full) {
+                metricsState = data.full;
+            } else if (metricsState && data.epoch === metricsEpoch && data.base === metricsVersion) {
+                applyPatch(metricsState, data.ops);
+            } else {
+                // Missed a patch; ask for the difference from what we have
+                socket.emit('subscribe_metrics', { version: metricsState ? metricsVersion : 0, epoch: metricsEpoch });
+                return;
+            }
+            metricsEpoch = data.epoch;
+            metricsVersion = data.version;
+            displayMetrics(metricsState.metrics);
+            updateStatusBadge(metricsState.status);
+        });
+
         socket.on('status_update', (data) => {
             updateStatusBadge(data);
         });
@@ -1190,6 +1373,36 @@ HTML_TEMPLATE = '''
             document.getElementById('enableHtmlReport').checked = config.enable_html_report;
             document.getElementById('enableNotifications').checked = config.enable_notifications || false;
             document.getElementById('enable6thPhase').checked = config.enable_6th_phase || false;
+
+            setPolling(config.client_polling || false);
+        }
+
+        // Metrics are pushed as patches; polling is only a fallback (client_polling)
+        function setPolling(enabled) {
+            if (enabled && !pollTimers) {
+                pollTimers = [setInterval(updateMetrics, 3000), setInterval(updateStatus, 2000)];
+            } else if (!enabled && pollTimers) {
+                pollTimers.forEach(clearInterval);
+                pollTimers = null;
+            }
+        }
+
+        // Apply RFC 6902 add/replace/remove operations in place
+        function applyPatch(doc, ops) {
+            for (const op of ops) {
+                const keys = op.path.split('/').slice(1)
+                    .map(key => key.replace(/~1/g, '/').replace(/~0/g, '~'));
+                const last = keys.pop();
+                const parent = keys.reduce((node, key) => node[key], doc);
+                if (op.op === 'remove') {
+                    if (Array.isArray(parent)) parent.splice(Number(last), 1);
+                    else delete parent[last];
+                } else if (Array.isArray(parent) && last === '-') {
+                    parent.push(op.value);
+                } else {
+                    parent[last] = op.value;
+                }
+            }
         }
 
         // Save config
@@ -1228,10 +1441,17 @@ HTML_TEMPLATE = '''
 
         // Pause agent
         async function pauseAgent() {
-            const response = await fetch('/api/pause', {method: 'POST'});
-            if (response.ok) {
+            const mode = document.getElementById('hardPause').checked ? 'hard' : 'soft';
+            const response = await fetch('/api/pause', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({mode})
+            });
+            const result = await response.json();
+            if (result.status === 'success') {
                 document.getElementById('pauseBtn').style.display = 'none';
                 document.getElementById('resumeBtn').style.display = 'block';
+                document.getElementById('resumeBtn').disabled = false;
             }
         }
 
@@ -1256,6 +1476,11 @@ HTML_TEMPLATE = '''
             }
         }
 
+        function formatDuration(seconds) {
+            const minutes = Math.floor(seconds / 60);
+            return minutes > 0 ? `${minutes}m ${seconds % 60}s` : `${seconds}s`;
+        }
+
         // Update status
         async function updateStatus() {
             const response = await fetch('/api/status');
@@ -1270,7 +1495,8 @@ HTML_TEMPLATE = '''
 
             if (status.running && status.paused) {
                 badge.className = 'status-badge paused';
-                text.textContent = 'Paused';
+                const pause = status.pause || {};
+                text.textContent = `Paused (${pause.mode || 'soft'}, ${formatDuration(pause.paused_for || 0)})`;
             } else if (status.running) {
                 badge.className = 'status-badge running';
                 text.textContent = 'Running';
@@ -1303,6 +1529,11 @@ HTML_TEMPLATE = '''
 
             document.getElementById('successRate').textContent = successRate + '%';
 
+            if (metrics.pacing && metrics.pacing.last_wait) {
+                document.getElementById('lastPause').textContent = metrics.pacing.last_wait.seconds + 's';
+                document.getElementById('pauseReason').textContent = metrics.pacing.last_wait.reason;
+            }
+
             document.getElementById('phaseQA').textContent = metrics.phase_breakdown.qa;
             document.getElementById('phaseDesign').textContent = metrics.phase_breakdown.design;
             document.getElementById('phasePerformance').textContent = metrics.phase_breakdown.performance;
@@ -1320,22 +1551,28 @@ HTML_TEMPLATE = '''
             document.getElementById('progressFill').style.width = progress + '%';
         }
 
-        // Append to terminal
-        function appendToTerminal(line) {
+        // Append a frame of lines to terminal
+        function appendToTerminal(lines) {
             const terminal = document.getElementById('terminal');
-            const div = document.createElement('div');
-            div.className = 'terminal-line';
-
-            if (line.includes('ERROR') || line.includes('FAILED')) {
-                div.className += ' error';
-            } else if (line.includes('SUCCESS') || line.includes('✅')) {
-                div.className += ' success';
-            } else if (line.includes('WARNING') || line.includes('⚠')) {
-                div.className += ' warning';
-            }
+            const fragment = document.createDocumentFragment();
+
+            lines.forEach(line => {
+                const div = document.createElement('div');
+                div.className = 'terminal-line';
+
+                if (line.includes('ERROR') || line.includes('FAILED')) {
+                    div.className += ' error';
+                } else if (line.includes('SUCCESS') || line.includes('✅')) {
+                    div.className += ' success';
+                } else if (line.includes('WARNING') || line.includes('⚠')) {
+                    div.className += ' warning';
+                }
+
+                div.textContent = line;
+                fragment.appendChild(div);
+            });
 
-            div.textContent = line;
-            terminal.appendChild(div);
+            terminal.appendChild(fragment);
             terminal.scrollTop = terminal.scrollHeight;
         }
 
@@ -1385,6 +1622,19 @@ HTML_TEMPLATE = '''
                         borderColor: '#4B5AED',
                         backgroundColor: 'rgba(75, 90, 237, 0.1)',
                         tension: 0.4
+                    }, {
+                        label: 'CPU %',
+                        data: [],
+                        borderColor: '#F59E0B',
+                        backgroundColor: 'rgba(245, 158, 11, 0.1)',
+                        tension: 0.4
+                    }, {
+                        label: 'RSS (MB)',
+                        data: [],
+                        borderColor: '#10B981',
+                        backgroundColor: 'rgba(16, 185, 129, 0.1)',
+                        tension: 0.4,
+                        yAxisID: 'y1'
                     }]
                 },
                 options: {
@@ -1393,10 +1643,16 @@ HTML_TEMPLATE = '''
                     scales: {
                         y: {
                             beginAtZero: true,
-                            max: 100,
+                            suggestedMax: 100,
                             ticks: { color: '#888' },
                             grid: { color: '#333' }
                         },
+                        y1: {
+                            beginAtZero: true,
+                            position: 'right',
+                            ticks: { color: '#888' },
+                            grid: { drawOnChartArea: false }
+                        },
                         x: {
                             ticks: { color: '#888' },
                             grid: { color: '#333' }
@@ -1419,11 +1675,24 @@ HTML_TEMPLATE = '''
                 ? Math.round((metrics.successful_phases / metrics.total_phases) * 100)
                 : 0;
 
+            // Latest sample of the agent's process tree (CPU can exceed 100% on several cores)
+            const sample = metrics.resources && metrics.resources.series.length
+                ? metrics.resources.series[metrics.resources.series.length - 1]
+                : { cpu_percent: 0, rss_mb: 0 };
+
             phaseData.push(successRate);
-            if (phaseData.length > 20) phaseData.shift();
+            cpuData.push(sample.cpu_percent);
+            rssData.push(sample.rss_mb);
+            if (phaseData.length > 20) {
+                phaseData.shift();
+                cpuData.shift();
+                rssData.shift();
+            }
 
             performanceChart.data.labels = phaseData.map((_, i) => i + 1);
             performanceChart.data.datasets[0].data = phaseData;
+            performanceChart.data.datasets[1].data = cpuData;
+            performanceChart.data.datasets[2].data = rssData;
             performanceChart.update('none');
         }
 
@@ -1449,8 +1718,6 @@ HTML_TEMPLATE = '''
 
         // Initialize
         initChart();
-        setInterval(updateMetrics, 3000);
-        setInterval(updateStatus, 2000);
     </script>
 </body>
 </html>
@@ -1472,10 +1739,14 @@ if __name__ == '__main__':
     print("📍 Control Panel: http://localhost:5000")
     print("⚙️  Configuration: agent_config.json")
     print("📄 Logs: agent.log")
-    print("📊 Metrics: agent_metrics.json")
+    print("📊 Metrics: agent_metrics.jsonl")
     print()
+    if SERVER_MODE == "gevent":
+        print(f"🔌 Server: gevent, up to {capacity()} concurrent connections")
+    else:
+        print("🔌 Server: threaded (AGENT_SERVER_MODE=gevent for many clients)")
     print("Press Ctrl+C to stop the server")
     print("=" * 70)
     print()
 
-    socketio.run(app, host='0.0.0.0', port=5000, debug=False, allow_unsafe_werkzeug=True)
+    serve(app, host='0.0.0.0', port=5000, socketio=socketio)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Run history store
+Append-only JSON Lines file with a fixed-width offset index for range queries
+"""
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime
+
+# One index record per run: byte offset into the .jsonl file, unix timestamp
+INDEX_RECORD = struct.Struct('<Qd')
+
+
+def _entry_time(entry):
+    try:
+        return datetime.fromisoformat(entry['timestamp']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+
+class HistoryStore:
+    """Unbounded run history with O(1) appends and "last N" / "since" queries.
+
+    Runs live in `path` (one JSON object per line); `path + '.idx'` holds a
+    (offset, timestamp) record per run so queries only read the runs they
+    return. The index is rebuilt from the data file if it is missing or stale.
+    """
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.lock = threading.Lock()
+        self.offsets = []
+        self.times = []
+        if legacy_path:
+            self._migrate(legacy_path)
+        self._load_index()
+
+    def _migrate(self, legacy_path):
+        """Import a whole-file JSON list written by older versions"""
+        if os.path.exists(self.path) or not os.path.exists(legacy_path):
+            return
+        try:
+            with open(legacy_path, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error migrating history: {e}")
+            return
+        with open(self.path, 'w') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + '\n')
+        os.replace(legacy_path, legacy_path + '.migrated')
+
+    def _load_index(self):
+        data_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        records = b''
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                records = f.read()
+        usable = len(records) - len(records) % INDEX_RECORD.size
+        self.offsets = []
+        self.times = []
+        for offset, timestamp in INDEX_RECORD.iter_unpack(records[:usable]):
+            if offset >= data_size:
+                break
+            self.offsets.append(offset)
+            self.times.append(timestamp)
+
+        if data_size == 0:
+            # History deleted or emptied: drop the stale index, nothing to scan
+            if records:
+                self._write_index()
+            return
+
+        if not self._starts_lines(self.offsets):
+            # Index from another version of the data file (e.g. crash in compact)
+            self.offsets = []
+            self.times = []
+
+        # Index whatever the index file is missing (first run, crash mid-append)
+        scan_from = 0
+        if self.offsets:
+            with open(self.path, 'rb') as f:
+                f.seek(self.offsets[-1])
+                f.readline()
+                scan_from = f.tell()
+        if scan_from < data_size or usable != len(self.offsets) * INDEX_RECORD.size:
+            with open(self.path, 'rb') as f:
+                f.seek(scan_from)
+                offset = scan_from
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Blank or half-written line
+                        entry = None
+                    if entry is not None:
+                        self.offsets.append(offset)
+                        self.times.append(_entry_time(entry))
+                    offset += len(line)
+            self._write_index()
+
+    def _starts_lines(self, offsets):
+        """True if every offset is the start of a line, in increasing order"""
+        if not offsets:
+            return True
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            previous = -1
+            for offset in offsets:
+                if offset <= previous or (offset > 0 and data[offset - 1] != 0x0a):
+                    return False
+                previous = offset
+        return True
+
+    def _write_index(self):
+        """Replace the index file atomically, so readers never see half of it"""
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            for record in zip(self.offsets, self.times):
+                f.write(INDEX_RECORD.pack(*record))
+        os.replace(tmp_path, self.index_path)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, entry):
+        """Add one run; cost does not depend on the history size"""
+        line = (json.dumps(entry) + '\n').encode('utf-8')
+        timestamp = _entry_time(entry)
+        with self.lock:
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                f.write(line)
+            with open(self.index_path, 'ab') as f:
+                f.write(INDEX_RECORD.pack(offset, timestamp))
+            self.offsets.append(offset)
+            self.times.append(timestamp)
+
+    def _read(self, start, stop):
+        if start >= stop:
+            return []
+        entries = []
+        with open(self.path, 'rb') as f:
+            for offset in self.offsets[start:stop]:
+                f.seek(offset)
+                entries.append(json.loads(f.readline()))
+        return entries
+
+    def last(self, n=50):
+        """The `n` most recent runs, oldest first"""
+        with self.lock:
+            return self._read(max(len(self.offsets) - n, 0), len(self.offsets))
+
+    def since(self, when, limit=None):
+        """Runs at or after `when` (datetime or unix time), oldest first"""
+        if isinstance(when, datetime):
+            when = when.timestamp()
+        with self.lock:
+            # Runs are appended in time order, so the index is sorted
+            start = bisect.bisect_left(self.times, when)
+            stop = len(self.offsets) if limit is None else min(start + limit, len(self.offsets))
+            return self._read(start, stop)
+
+    def compact(self, keep_last):
+        """Drop all but the `keep_last` most recent runs"""
+        with self.lock:
+            start = max(len(self.offsets) - keep_last, 0)
+            if start == 0:
+                return 0
+            with open(self.path, 'rb') as f:
+                f.seek(self.offsets[start])
+                data = f.read()
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+
+            base = self.offsets[start]
+            self.offsets = [offset - base for offset in self.offsets[start:]]
+            self.times = self.times[start:]
+            self._write_index()
+            return start
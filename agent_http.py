@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - HTTP caching and compression
+Pre-compressed page shell, content-hash ETags with 304s, and gzip/brotli for JSON
+"""
+
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    # Optional: without it only gzip is offered
+    brotli = None
+
+# Smaller bodies are sent as-is; compressing them saves less than the headers cost
+COMPRESS_MIN_BYTES = 1024
+
+# Preference when a client accepts several codings equally
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def content_etag(body):
+    """Strong ETag from the body bytes"""
+    return '"' + hashlib.sha1(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header lists `etag` (weak comparison, as RFC 9110 asks)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    tag = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        # The encoded variants of one body share a validator
+        if candidate == tag or candidate.rstrip('"').rsplit('-', 1)[0] + '"' == tag:
+            return True
+    return False
+
+
+def choose_encoding(accept_encoding):
+    """Best coding we can produce for an Accept-Encoding header, or None"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    best = None
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (encoding, quality)
+    return best[0] if best else None
+
+
+def compress(body, encoding, level=6):
+    if encoding == 'br':
+        # Quality 11 is for bodies compressed once; 5 is about gzip -6 speed
+        return brotli.compress(body, quality=11 if level >= 9 else 5)
+    # mtime=0 keeps the output (and so any cache keyed on it) deterministic
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+class StaticAsset:
+    """A response body rendered once, with every encoding prepared up front.
+
+    `select()` is a dictionary lookup per request: the page shell never goes
+    through Jinja or a compressor again, and revalidation costs a 304.
+    """
+
+    def __init__(self, body, content_type):
+        self.content_type = content_type
+        self.etag = content_etag(body)
+        self.variants = {None: body}
+        for encoding in ENCODINGS:
+            self.variants[encoding] = compress(body, encoding, level=9)
+
+    def select(self, accept_encoding, if_none_match):
+        """(status, headers, body) for one request"""
+        encoding = choose_encoding(accept_encoding)
+        etag = self.etag if encoding is None else f'{self.etag[:-1]}-{encoding}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept-Encoding"
+        }
+        if etag_matches(if_none_match, self.etag):
+            return 304, headers, b''
+        headers["Content-Type"] = self.content_type
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return 200, headers, self.variants[encoding]
+
+
+def finalize_json(response, if_none_match, accept_encoding, min_size=COMPRESS_MIN_BYTES):
+    """ETag, 304 and compression for a buffered JSON response (Flask/Werkzeug).
+
+    Meant for an after_request hook. Streaming responses, non-200 responses
+    and responses that already carry an encoding are left alone.
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers):
+        return response
+
+    body = response.get_data()
+    etag = content_etag(body)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Vary"] = "Accept-Encoding"
+
+    encoding = choose_encoding(accept_encoding) if len(body) >= min_size else None
+    response.headers["ETag"] = etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+    if etag_matches(if_none_match, etag):
+        response.status_code = 304
+        response.set_data(b'')
+        response.headers.pop("Content-Type", None)
+        return response
+
+    if encoding is not None:
+        response.set_data(compress(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Multi-run job scheduler
+Queues orchestrator runs for several project repos with priorities and limits
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+from agent_events import LOOP_START, PHASE_START, classify
+from agent_metrics import LogMetrics, MetricsIngester
+from agent_orchestrator import Orchestrator
+from agent_server import run_native
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class Job:
+    """One queued or running orchestrator run for one project repo.
+
+    Logs and metrics live in the project's own directory (agent.log,
+    agent_metrics.jsonl, ...), so every job has its own namespace; the
+    last `tail_lines` output lines are also kept in memory for the API.
+    """
+
+    def __init__(self, job_id, repo_dir, config, priority=0, tail_lines=500, pacer=None,
+                 on_line=None, on_start=None, on_finish=None):
+        self.id = job_id
+        self.repo_dir = os.path.abspath(repo_dir)
+        self.config = dict(config)
+        self.priority = priority
+        self.pacer = pacer
+        self.on_line = on_line
+        self.on_start = on_start
+        self.on_finish = on_finish
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.exit_code = None
+        self.error = None
+        self.loop = 0
+        self.phase = 0
+        self.lines = deque(maxlen=tail_lines)
+        self.log_metrics = LogMetrics(os.path.join(self.repo_dir, "agent.log"))
+        self.metrics_ingester = MetricsIngester(os.path.join(self.repo_dir, "agent_metrics.jsonl"))
+        self.orchestrator = None
+        self.thread = None
+        self.cancel_requested = False
+
+    def _line(self, line):
+        event = classify(line)
+        if event and event.kind == LOOP_START:
+            self.loop = event.number
+        elif event and event.kind == PHASE_START:
+            self.phase = event.number
+        self.lines.append(line.rstrip('\n'))
+        if self.on_line is not None:
+            self.on_line(line)
+
+    def metrics(self):
+        """Counters from this job's agent.log and agent_metrics.jsonl"""
+        return {"log": self.log_metrics.poll(), "events": self.metrics_ingester.poll()}
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "repo": self.repo_dir,
+            "priority": self.priority,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "exit_code": self.exit_code,
+            "error": self.error,
+            "loop": self.loop,
+            "phase": self.phase,
+            "max_loops": self.config.get("max_loops"),
+            "pause": self.orchestrator.pause_status() if self.orchestrator else None
+        }
+
+
+class JobScheduler:
+    """Runs queued jobs highest priority first (FIFO within a priority).
+
+    At most `max_running` jobs run at once, and one job per repo. Builds are
+    CPU-bound while model calls mostly wait on the API, so builds across all
+    jobs additionally share `max_builds` slots.
+    """
+
+    def __init__(self, max_running=2, max_builds=1, build_cache=None, build_worker=None,
+                 script_path="Claude.fish", on_change=None):
+        self.max_running = max_running
+        self.build_slots = threading.BoundedSemaphore(max_builds)
+        self.max_builds = max_builds
+        self.build_cache = build_cache
+        self.build_worker = build_worker
+        # Projects other than the control panel's own have no Claude.fish
+        self.script_path = os.path.abspath(script_path)
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.queue = []
+        self.jobs = {}
+        self.ids = itertools.count(1)
+        self.order = itertools.count()
+
+    def _changed(self, job):
+        if self.on_change is not None:
+            try:
+                self.on_change(job)
+            except Exception as e:
+                print(f"Error in job listener: {e}")
+
+    def submit(self, repo_dir, config, priority=0, pacer=None, on_line=None, on_start=None,
+               on_finish=None):
+        """Queue a run; it starts as soon as the limits allow"""
+        with self.lock:
+            job = Job(next(self.ids), repo_dir, config, priority, pacer=pacer,
+                      on_line=on_line, on_start=on_start, on_finish=on_finish)
+            self.jobs[job.id] = job
+            heapq.heappush(self.queue, (-priority, next(self.order), job))
+        self._changed(job)
+        self._dispatch()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Drop a queued job or stop a running one; False if already finished"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return False
+            job.cancel_requested = True
+            if job.status == QUEUED:
+                self.queue = [entry for entry in self.queue if entry[2] is not job]
+                heapq.heapify(self.queue)
+                job.status = CANCELLED
+                job.finished_at = time.time()
+            orchestrator = job.orchestrator
+        if orchestrator is not None:
+            orchestrator.stop()
+        self._changed(job)
+        return True
+
+    def _dispatch(self):
+        started = []
+        with self.lock:
+            busy = {job.repo_dir for job in self.jobs.values() if job.status == RUNNING}
+            waiting = []
+            while self.queue and len(busy) < self.max_running:
+                entry = heapq.heappop(self.queue)
+                job = entry[2]
+                if job.repo_dir in busy:
+                    # Same repo already running; keep its place in the queue
+                    waiting.append(entry)
+                    continue
+                job.status = RUNNING
+                job.started_at = time.time()
+                job.orchestrator = Orchestrator(
+                    job.config,
+                    on_line=job._line,
+                    repo_dir=job.repo_dir,
+                    script_path=self.script_path,
+                    build_cache=self.build_cache,
+                    build_worker=self.build_worker,
+                    pacer=job.pacer,
+                    build_slots=self.build_slots
+                )
+                busy.add(job.repo_dir)
+                started.append(job)
+            for entry in waiting:
+                heapq.heappush(self.queue, entry)
+
+        for job in started:
+            job.thread = threading.Thread(target=self._run, args=(job,), daemon=True)
+            job.thread.start()
+            self._changed(job)
+
+    async def _main(self, job):
+        orchestrator = job.orchestrator
+        # Set before checking the flag, so a concurrent cancel() either sees
+        # the task or is seen here
+        orchestrator.loop = asyncio.get_running_loop()
+        orchestrator.task = asyncio.current_task()
+        if job.cancel_requested:
+            raise asyncio.CancelledError()
+        return await orchestrator.run()
+
+    def _loop(self, job):
+        """Run the job's event loop; None if it was cancelled"""
+        try:
+            return asyncio.run(self._main(job))
+        except asyncio.CancelledError:
+            return None
+
+    def _run(self, job):
+        try:
+            if job.on_start is not None:
+                job.on_start(job)
+            # asyncio allows one running loop per OS thread; under gevent
+            # every job thread is a greenlet on the same one
+            job.exit_code = run_native(self._loop, job)
+            if job.exit_code is None:
+                job.status = CANCELLED
+            else:
+                job.status = DONE if job.exit_code == 0 else FAILED
+        except Exception as e:
+            print(f"Error running job {job.id}: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            if job.on_finish is not None:
+                try:
+                    job.on_finish(job)
+                except Exception as e:
+                    print(f"Error finishing job {job.id}: {e}")
+            with self.lock:
+                job.orchestrator = None
+            self._changed(job)
+            self._dispatch()
+
+    def status(self):
+        with self.lock:
+            jobs = sorted(self.jobs.values(), key=lambda job: job.id)
+            return {
+                "max_running": self.max_running,
+                "max_builds": self.max_builds,
+                "running": sum(1 for job in jobs if job.status == RUNNING),
+                "queued": sum(1 for job in jobs if job.status == QUEUED),
+                "jobs": [job.to_dict() for job in jobs]
+            }
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Log file helpers
+Incremental, offset-based readers shared by both control panels
+"""
+
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+
+# Leading bytes remembered to spot a replaced file that reused the old inode
+FINGERPRINT_SIZE = 64
+
+
+class LogFollower:
+    """Follow a growing file by byte offset, returning only new complete lines"""
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.inode = None
+        self._partial = b''
+        self._head = b''
+
+    @property
+    def position(self):
+        """Byte offset just past the last complete line handed out"""
+        return self.offset - len(self._partial)
+
+    def reset(self, offset=0):
+        """Forget all progress and continue reading from `offset`"""
+        self.offset = offset
+        self._partial = b''
+        self._head = b''
+
+    def read_new(self):
+        """Return (lines, reset) for bytes appended since the last call.
+
+        `reset` is True when the file was truncated, rotated or removed and
+        reading restarted from the beginning; callers should drop any state
+        they built from earlier lines.
+        """
+        data, was_reset = self.read_new_raw()
+        lines = data.decode('utf-8', errors='replace').splitlines(keepends=True)
+        return lines, was_reset
+
+    def read_new_raw(self):
+        """Like read_new(), but return the complete new lines as one bytes blob"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            if self.inode is None:
+                return b'', False
+            self.inode = None
+            self.reset()
+            return b'', True
+
+        was_reset = False
+        if self.inode is not None and (st.st_ino != self.inode or st.st_size < self.offset):
+            self.reset()
+            was_reset = True
+        self.inode = st.st_ino
+
+        if st.st_size == self.offset and not self._head:
+            return b'', was_reset
+
+        with open(self.path, 'rb') as f:
+            if self._head and f.read(len(self._head)) != self._head:
+                self.reset()
+                was_reset = True
+            if st.st_size == self.offset:
+                return b'', was_reset
+            f.seek(self.offset)
+            data = f.read(st.st_size - self.offset)
+        if self.offset == len(self._head) and self.offset < FINGERPRINT_SIZE:
+            self._head = (self._head + data)[:FINGERPRINT_SIZE]
+        self.offset += len(data)
+
+        data = self._partial + data
+        cut = data.rfind(b'\n') + 1
+        self._partial = data[cut:]
+        return data[:cut], was_reset
+
+
+def tail_file(filename, num_lines=50, block_size=8192):
+    """Tail last N lines of a file by reading backwards from EOF"""
+    if num_lines <= 0 or not os.path.exists(filename):
+        return []
+    try:
+        with open(filename, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            pos = end
+            data = b''
+            # One extra newline: the last line usually ends with one
+            while pos > 0 and data.count(b'\n') <= num_lines:
+                step = min(block_size, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+        lines = data.decode('utf-8', errors='replace').splitlines(keepends=True)
+        return lines[-num_lines:]
+    except:
+        return []
+
+
+class LineIndex:
+    """Sparse line -> byte offset index for paging through large log files"""
+
+    def __init__(self, path, every=1000, chunk_size=1 << 20):
+        self.path = path
+        self.every = every
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self._reset()
+        self.inode = None
+
+    def _reset(self):
+        # checkpoints[k] is the byte offset where line k * every starts
+        self.checkpoints = [0]
+        self.line_count = 0
+        self.scanned = 0
+
+    def _update(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self.inode = None
+            self._reset()
+            return
+        if st.st_ino != self.inode or st.st_size < self.scanned:
+            self._reset()
+        self.inode = st.st_ino
+        if st.st_size == self.scanned:
+            return
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.scanned)
+            while self.scanned < st.st_size:
+                chunk = f.read(min(self.chunk_size, st.st_size - self.scanned))
+                if not chunk:
+                    break
+                # Only newline-terminated lines count; find just the ones on a checkpoint
+                newlines = chunk.count(b'\n')
+                pos = -1
+                seen = self.line_count
+                next_mark = len(self.checkpoints) * self.every
+                while next_mark <= self.line_count + newlines:
+                    for _ in range(next_mark - seen):
+                        pos = chunk.find(b'\n', pos + 1)
+                    seen = next_mark
+                    self.checkpoints.append(self.scanned + pos + 1)
+                    next_mark += self.every
+                self.line_count += newlines
+                self.scanned += len(chunk)
+
+    def read_lines(self, from_line, limit):
+        """Return (lines, total_lines) for `limit` lines starting at `from_line` (0-based)"""
+        with self.lock:
+            self._update()
+            total = self.line_count
+            if limit <= 0 or from_line >= total:
+                return [], total
+            from_line = max(from_line, 0)
+            limit = min(limit, total - from_line)
+            start = self.checkpoints[from_line // self.every]
+            skip = from_line % self.every
+
+        lines = []
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            for i, raw in enumerate(f):
+                if i < skip:
+                    continue
+                lines.append(raw.decode('utf-8', errors='replace'))
+                if len(lines) >= limit:
+                    break
+        return lines, total
+
+
+# ==========================================
+# SHARED FILE WATCHER
+# ==========================================
+
+IN_MODIFY = 0x00000002
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_EVENT_HEADER = struct.Struct('iIII')
+
+
+def _open_inotify(directory):
+    """Return an inotify fd watching `directory`, or None where unsupported"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        mask = IN_MODIFY | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+def _inotify_names(fd):
+    """Drain pending inotify events and return the file names they refer to"""
+    names = set()
+    while True:
+        try:
+            buf = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        pos = 0
+        while pos + IN_EVENT_HEADER.size <= len(buf):
+            _wd, _mask, _cookie, length = IN_EVENT_HEADER.unpack_from(buf, pos)
+            pos += IN_EVENT_HEADER.size
+            names.add(buf[pos:pos + length].rstrip(b'\0').decode('utf-8', errors='replace'))
+            pos += length
+
+
+class LogWatcher:
+    """One background follower per file that fans new lines out to subscribers.
+
+    Each subscriber gets a bounded queue of (end_offset, line) tuples. A
+    subscriber that falls behind is sent None and dropped; SSE clients then
+    reconnect with Last-Event-ID and catch up from disk.
+    """
+
+    def __init__(self, path, poll_interval=1.0, queue_size=1000, catchup_bytes=1 << 20):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.catchup_bytes = catchup_bytes
+        self.follower = LogFollower(path)
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            # Live subscribers only need what is appended from now on
+            try:
+                self.follower.reset(os.path.getsize(self.path))
+                self.follower.inode = os.stat(self.path).st_ino
+            except OSError:
+                pass
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def subscribe(self, since=0):
+        """Register a new queue, pre-filled with lines after byte offset `since`"""
+        self.start()
+        q = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            position = self.follower.position
+            if since is not None and since < position:
+                items = self._read_range(since, position)
+                # Leave room for live lines, or the next publish drops the queue
+                for item in items[max(len(items) - self.queue_size // 2, 0):]:
+                    q.put_nowait(item)
+            self.subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def _read_range(self, start, end):
+        """Return (end_offset, line) tuples for complete lines in [start, end)"""
+        start = max(start, end - self.catchup_bytes)
+        try:
+            with open(self.path, 'rb') as f:
+                if start > 0:
+                    # Resume on a line boundary
+                    f.seek(start - 1)
+                    if f.read(1) != b'\n':
+                        f.readline()
+                data = f.read(max(end - f.tell(), 0))
+                return _split_with_offsets(data, end - len(data))
+        except OSError:
+            return []
+
+    def _publish(self):
+        with self.lock:
+            data, _was_reset = self.follower.read_new_raw()
+            if not data:
+                return
+            items = _split_with_offsets(data, self.follower.position - len(data))
+            for q in list(self.subscribers):
+                try:
+                    for item in items:
+                        q.put_nowait(item)
+                except queue.Full:
+                    # Too slow: drop the backlog and tell the client to reconnect
+                    self.subscribers.discard(q)
+                    while not q.empty():
+                        q.get_nowait()
+                    q.put_nowait(None)
+
+    def _run(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        name = os.path.basename(self.path)
+        fd = _open_inotify(directory)
+        try:
+            # Pick up anything written before the watch was in place
+            self._publish()
+            while True:
+                if fd is None:
+                    time.sleep(self.poll_interval)
+                else:
+                    # The timeout doubles as a safety poll for missed events
+                    ready, _, _ = select.select([fd], [], [], self.poll_interval * 5)
+                    if ready and name not in _inotify_names(fd):
+                        continue
+                try:
+                    self._publish()
+                except Exception as e:
+                    print(f"Error watching {self.path}: {e}")
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+
+def _split_with_offsets(data, start):
+    """Split complete lines from `data` into (end_offset, text) tuples"""
+    items = []
+    offset = start
+    for raw in data.splitlines(keepends=True):
+        offset += len(raw)
+        items.append((offset, raw.decode('utf-8', errors='replace')))
+    return items
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Metrics aggregation
+Keeps log and agent_metrics.jsonl counters in memory, parsing only appended bytes
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+from agent_events import CHECKPOINT, EVENT_KINDS, LOOP_START, MILESTONE, PHASE_START, classify
+from agent_logs import LogFollower
+
+
+class LogMetrics:
+    """Stateful event counters over agent.log, updated incrementally on each poll"""
+
+    def __init__(self, path):
+        self.follower = LogFollower(path)
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.counts = dict.fromkeys(EVENT_KINDS, 0)
+        self.phase_counts = {}
+        self.current_loop = 0
+        self.current_phase = 0
+        self.checkpoints = []
+        self.milestones = []
+
+    def _consume(self, line):
+        event = classify(line)
+        if event is None or event.kind is None:
+            return
+
+        self.counts[event.kind] += 1
+        if event.kind == LOOP_START:
+            self.current_loop = event.number
+        elif event.kind == PHASE_START:
+            self.current_phase = event.number
+            self.phase_counts[event.number] = self.phase_counts.get(event.number, 0) + 1
+        elif event.kind == MILESTONE:
+            self.milestones.append(event.number)
+        elif event.kind == CHECKPOINT:
+            self.checkpoints.append({"loop": self.current_loop, "result": event.detail})
+
+    def poll(self):
+        """Parse whatever was appended since the last poll and return a snapshot"""
+        with self.lock:
+            lines, was_reset = self.follower.read_new()
+            if was_reset:
+                self._reset()
+            for line in lines:
+                self._consume(line)
+
+            return {
+                "counts": dict(self.counts),
+                "phase_counts": dict(self.phase_counts),
+                "current_loop": self.current_loop,
+                "current_phase": self.current_phase,
+                "checkpoints": list(self.checkpoints),
+                "milestones": list(self.milestones)
+            }
+
+
+class MetricsIngester:
+    """Tail agent_metrics.jsonl (written by log_metric) into typed time series.
+
+    The orchestrator (like Claude.fish) truncates the file at the start of
+    every run, so the series always describe the current run.
+    """
+
+    def __init__(self, path, max_points=1000):
+        self.follower = LogFollower(path)
+        self.max_points = max_points
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.totals = {}
+        self.series = {}
+
+    def _consume(self, line):
+        try:
+            record = json.loads(line)
+            name = record["metric"]
+        except (ValueError, KeyError, TypeError):
+            return
+        value = record.get("value")
+
+        # checkpoint_<loop> -> one "checkpoint" series with the loop in the value
+        if name.startswith("checkpoint_"):
+            loop = name[len("checkpoint_"):]
+            name = "checkpoint"
+            value = {"loop": int(loop) if loop.isdigit() else loop, "result": value}
+        elif isinstance(value, str) and value.lstrip('-').isdigit():
+            value = int(value)
+
+        self.totals[name] = self.totals.get(name, 0) + 1
+        if name not in self.series:
+            self.series[name] = deque(maxlen=self.max_points)
+        self.series[name].append({"timestamp": record.get("timestamp"), "value": value})
+
+    def poll(self):
+        """Ingest newly appended records and return totals plus series"""
+        with self.lock:
+            lines, was_reset = self.follower.read_new()
+            if was_reset:
+                self._reset()
+            for line in lines:
+                self._consume(line)
+
+            return {
+                "totals": dict(self.totals),
+                "series": {name: list(points) for name, points in self.series.items()}
+            }
+
+
+class SnapshotCache:
+    """Single-flight, TTL-bounded cache around one expensive snapshot function.
+
+    A snapshot younger than `ttl` is returned as-is. Otherwise one caller
+    recomputes it while every concurrent caller waits for that same result,
+    so the number of computations depends on time and `invalidate()` calls
+    (new events), not on how many tabs and sockets are asking.
+    """
+
+    def __init__(self, compute, ttl=2.0, clock=time.monotonic):
+        self.compute = compute
+        self.ttl = ttl
+        self.clock = clock
+        self.cond = threading.Condition()
+        self.value = None
+        self.error = None
+        self.computed_at = None
+        self.stale = True
+        self.inflight = False
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.last_duration = 0.0
+
+    def invalidate(self):
+        """The next get() recomputes, even within the TTL"""
+        with self.cond:
+            self.stale = True
+
+    def get(self):
+        with self.cond:
+            if self.inflight:
+                self.shared += 1
+                generation = self.generation
+                self.cond.wait_for(lambda: self.generation != generation)
+                if self.error is not None:
+                    raise self.error
+                return self.value
+            if not self.stale and self.clock() - self.computed_at < self.ttl:
+                self.hits += 1
+                return self.value
+            self.inflight = True
+            self.misses += 1
+            # Cleared before computing, so an invalidate() during the
+            # computation is not lost
+            self.stale = False
+
+        started = self.clock()
+        try:
+            value = self.compute()
+        except Exception as e:
+            with self.cond:
+                self.error = e
+                self.stale = True
+                self.inflight = False
+                self.generation += 1
+                self.cond.notify_all()
+            raise
+
+        with self.cond:
+            self.value = value
+            self.error = None
+            self.computed_at = self.clock()
+            self.last_duration = self.computed_at - started
+            self.inflight = False
+            self.generation += 1
+            self.cond.notify_all()
+            return value
+
+    def stats(self):
+        with self.cond:
+            return {
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared": self.shared,
+                "age": round(self.clock() - self.computed_at, 2) if self.computed_at is not None else None,
+                "last_duration_ms": int(self.last_duration * 1000)
+            }
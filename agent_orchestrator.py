@@ -0,0 +1,1163 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Python orchestrator
+Runs the five-phase loop of Claude.fish on asyncio subprocesses, so the
+control panel drives it directly instead of templating and scraping a script
+"""
+
+import asyncio
+import codecs
+import hashlib
+import json
+import os
+import re
+import shutil
+import signal
+import tempfile
+import time
+from datetime import datetime
+
+from agent_builds import (
+    AGENT_FILES, build_key, build_typechecks, first_errors, format_result, lockfile_digest,
+    typecheck_command
+)
+from agent_pacing import PauseScheduler
+
+# (number, icon, log title, commit title) - same wording as Claude.fish
+PHASES = [
+    (1, "🐞", "React QA & Type Safety (Adaptive)", "QA & Type Safety"),
+    (2, "🎨", "UI/UX Design (Adaptive + Context)", "UI/UX Design"),
+    (3, "⚡", "Performance Optimization (Adaptive)", "Performance"),
+    (4, "🔒", "Security & Validation (Adaptive)", "Security"),
+    (5, "🧹", "Architecture Cleanup (Adaptive)", "Cleanup")
+]
+
+# Ignored paths a worktree needs to build, symlinked from the main checkout
+LINKED_PATHS = ("node_modules", ".env", ".env.local", ".env.production", ".env.production.local")
+
+# Subprocess output is read in chunks this size, not line by line
+READ_CHUNK = 1 << 16
+
+RULE = "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
+
+# zclaude is a fish function from ~/.config/fish/config.fish, so model calls
+# and the adaptive prompts (defined in Claude.fish) still go through fish
+MODEL_COMMAND = 'zclaude -p "$SCALESITE_PROMPT" --dangerously-skip-permissions'
+PROMPT_FUNCTION_PATTERN = re.compile(r'^function get_adaptive_prompt_\d+\b.*?^end$', re.S | re.M)
+
+REPAIR_PROMPT = """🚨 CRITICAL BUILD FAILURE - Emergency QA Engineer Mode.
+
+ERROR LOG (Last 50 lines):
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+{error_log}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+REPAIR PROTOCOL:
+1. IDENTIFY Error Type:
+   [TS] TypeScript error → Line + File + Expected vs. Got
+   [IMPORT] Module error → Check import path + file exists
+   [SYNTAX] Syntax error → Missing bracket/semicolon/quote
+   [RUNTIME] Runtime error → Undefined access, null reference
+
+2. FIX Strategy:
+   - TypeScript: Add type assertion OR fix type definition
+   - Import: Correct path OR add missing file
+   - Syntax: Add missing character
+   - Runtime: Add optional chaining OR null check
+
+3. SINGLE FOCUS:
+   Fix ONLY the first error listed
+   Ignore subsequent errors (they might auto-resolve)
+
+DEBUGGING CHECKLIST:
+□ Error message understood?
+□ File + Line identified?
+□ Root cause clear?
+□ Fix minimal and surgical?
+
+CRITICAL RULES:
+✗ NO refactoring
+✗ NO optimizations
+✗ NO style changes
+✗ NO feature additions
+✓ ONLY fix the breaking error
+
+Execute minimal fix NOW."""
+
+
+class EmergencyStop(Exception):
+    """Too many failed repairs; the run is aborted like Claude.fish's exit 1"""
+
+
+class RunStats:
+    """Run-wide counters, shared with the per-phase worktree orchestrators"""
+
+    def __init__(self):
+        self.total_phases = 0
+        self.successful_phases = 0
+        self.failed_repairs = 0
+        self.skipped_phases = 0
+        self.files_changed = 0
+        self.lines_added = 0
+        self.lines_removed = 0
+        self.phase_success = dict.fromkeys(range(1, 6), 0)
+
+
+class PauseControl:
+    """Pause state shared by an orchestrator and its worktree orchestrators"""
+
+    def __init__(self):
+        self.resumed = None
+        self.requested = False
+        self.hard = False
+        self.since = None
+        self.total = 0.0
+        # Builds of this run in the shared warm worker, and whether it is stopped
+        self.worker_builds = 0
+        self.worker_stopped = False
+
+    def status(self):
+        paused_for = time.monotonic() - self.since if self.since is not None else 0.0
+        return {
+            "paused": self.requested,
+            "mode": ("hard" if self.hard else "soft") if self.requested else None,
+            "paused_for": round(paused_for),
+            "paused_total": round(self.total + paused_for)
+        }
+
+
+class Orchestrator:
+    """Asyncio port of the Claude.fish main loop.
+
+    Every log line is written to agent.log (errors also to agent_errors.log)
+    with the same wording as the fish script and handed to `on_line`, so the
+    existing classifier, metrics and timing code work unchanged. Git
+    bookkeeping that nothing downstream waits for (diff stats, session commit
+    counts) runs as background tasks alongside the next model call.
+    """
+
+    def __init__(self, config, on_line=None, repo_dir=None, script_path="Claude.fish",
+                 log_file="agent.log", error_log_file="agent_errors.log",
+                 metrics_file="agent_metrics.jsonl", report_file="agent_report.html",
+                 build_cache=None, build_worker=None, pacer=None, build_slots=None):
+        self.config = dict(config)
+        self.on_line = on_line or (lambda line: None)
+        self.repo_dir = repo_dir or os.getcwd()
+        self.script_path = script_path
+        self.log_file = log_file
+        self.error_log_file = error_log_file
+        self.metrics_file = metrics_file
+        self.report_file = report_file
+        self.build_cache = build_cache if self.config.get('enable_build_cache', True) else None
+        self.build_worker = build_worker if self.config.get('enable_build_worker', True) else None
+        # Semaphore shared by every run of the control panel; None = unlimited
+        self.build_slots = build_slots
+        self.index_path = None
+
+        # A pacer passed in is shared with other runs: its strikes and call
+        # budget outlive this run, and only its own pause_seconds apply here
+        self.pacer = None
+        self.owns_pacer = False
+        if self.config.get('adaptive_pause', True):
+            self.owns_pacer = pacer is None
+            self.pacer = pacer or PauseScheduler(base_pause=self.config.get('pause_seconds', 240))
+
+        self.loop = None
+        self.task = None
+        self.cancel_requested = False
+        self.processes = set()
+        self.background = set()
+        self.prompt_functions = None
+
+        self.stats = RunStats()
+        self.control = PauseControl()
+
+        # Set on the per-phase orchestrators of parallel mode
+        self.stream_prefix = ""
+        self.stage_excludes = ()
+        self.track_stats = True
+
+    # ==========================================
+    # LOGGING
+    # ==========================================
+
+    def _write(self, text, error=False):
+        line = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {text}\n"
+        paths = [self.log_file, self.error_log_file] if error else [self.log_file]
+        for path in paths:
+            with open(os.path.join(self.repo_dir, path), 'a') as f:
+                f.write(line)
+        self.on_line(line)
+
+    def log_msg(self, text):
+        self._write(text)
+
+    def log_error(self, text):
+        self._write(f"❌ ERROR: {text}", error=True)
+
+    def log_success(self, text):
+        self._write(f"✅ {text}")
+
+    def log_metric(self, name, value):
+        record = {"timestamp": int(datetime.now().timestamp()), "metric": name, "value": str(value)}
+        with open(os.path.join(self.repo_dir, self.metrics_file), 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    # ==========================================
+    # SUBPROCESSES
+    # ==========================================
+
+    async def _exec(self, *cmd, env=None, stream=False):
+        """Run a command in its own process group; return (exit code, output)"""
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            cwd=self.repo_dir,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            env={**os.environ, **(env or {})},
+            start_new_session=True
+        )
+        self.processes.add(process)
+        if self.control.hard:
+            # Started while hard-paused (e.g. by a phase that was mid-step)
+            self._kill(process, signal.SIGSTOP)
+        try:
+            # Multi-byte characters may straddle chunks; invalid bytes become U+FFFD
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            chunks = []
+            pending = []
+            while True:
+                data = await process.stdout.read(READ_CHUNK)
+                text = decoder.decode(data, final=not data)
+                if text:
+                    chunks.append(text)
+                    if stream:
+                        pending = self._stream_lines(pending, text)
+                if not data:
+                    break
+            if pending:
+                self.on_line(self.stream_prefix + ''.join(pending) + '\n')
+            return await process.wait(), ''.join(chunks)
+        finally:
+            self.processes.discard(process)
+            if process.returncode is None:
+                self._kill(process)
+
+    def _stream_lines(self, pending, text):
+        """Pass the complete lines of `pending` + `text` to on_line; return the rest.
+
+        Only chunks that finish a line are joined and split, so a long line
+        arriving in many chunks is not re-copied on every read.
+        """
+        end = text.rfind('\n')
+        if end < 0:
+            pending.append(text)
+            return pending
+        pending.append(text[:end])
+        for line in ''.join(pending).split('\n'):
+            self.on_line(self.stream_prefix + line + '\n')
+        return [text[end + 1:]] if end + 1 < len(text) else []
+
+    def _kill(self, process, sig=signal.SIGTERM):
+        try:
+            os.killpg(process.pid, sig)
+            if sig == signal.SIGTERM and self.control.hard:
+                # A stopped process only acts on SIGTERM once continued
+                os.killpg(process.pid, signal.SIGCONT)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def git(self, *args):
+        return await self._exec('git', *args)
+
+    async def stage(self):
+        return await self.git('add', '.', *self.stage_excludes)
+
+    async def fish(self, command, env=None, stream=False):
+        return await self._exec('fish', '-c', command, env=env, stream=stream)
+
+    async def _tree_excludes(self, env):
+        """Exclude pathspecs for the agent files git would stage, or None on error.
+
+        `git add` exits 1 on an exclude pathspec that names a gitignored file,
+        so the agent files the project already ignores are left out.
+        """
+        code, output = await self._exec('git', 'check-ignore', '--', *AGENT_FILES, env=env)
+        if code not in (0, 1):
+            return None
+        ignored = set(output.split())
+        return [f":(exclude){name}" for name in AGENT_FILES if name not in ignored]
+
+    async def working_tree(self):
+        """Tree id of the working directory as `git add -A` would commit it.
+
+        Staged into a throwaway copy of the index, so the real index is not
+        touched and unchanged files are not rehashed.
+        """
+        if self.index_path is None:
+            code, path = await self.git('rev-parse', '--git-path', 'index')
+            if code != 0:
+                return None
+            self.index_path = os.path.join(self.repo_dir, path.strip())
+
+        fd, index = tempfile.mkstemp(prefix='agent-index-')
+        os.close(fd)
+        try:
+            if os.path.exists(self.index_path):
+                shutil.copyfile(self.index_path, index)
+            else:
+                os.remove(index)
+            env = {"GIT_INDEX_FILE": index}
+            excludes = await self._tree_excludes(env)
+            if excludes is None:
+                return None
+            # Any failure (index lock, unreadable file) would hash a stale index
+            code, _ = await self._exec('git', 'add', '-A', '--', '.', *excludes, env=env)
+            if code != 0:
+                return None
+            code, tree = await self._exec('git', 'write-tree', env=env)
+            return tree.strip() if code == 0 else None
+        finally:
+            if os.path.exists(index):
+                os.remove(index)
+
+    async def build(self):
+        """`npm run build`, memoized by working tree and lockfile.
+
+        Runs at most once per tree; the output is kept with the result, so a
+        failed build never has to be repeated for the repair prompt.
+        """
+        key = None
+        if self.build_cache is not None:
+            tree = await self.working_tree()
+            if tree:
+                key = build_key(tree, lockfile_digest(self.repo_dir))
+                cached = self.build_cache.get(key)
+                if cached is not None:
+                    self.log_metric("build_cache", "hit")
+                    return cached
+
+        ok, output = await self.slotted(self.verify)
+        if key is not None:
+            self.build_cache.put(key, ok, output)
+            self.log_metric("build_cache", "miss")
+        return ok, output
+
+    async def slotted(self, func):
+        """Await `func()` holding one of the shared build slots.
+
+        Polls instead of blocking an executor thread, so a stopped run
+        never ends up holding a slot it acquired after being cancelled.
+        """
+        if self.build_slots is None:
+            return await func()
+        started = asyncio.get_running_loop().time()
+        while not self.build_slots.acquire(blocking=False):
+            await asyncio.sleep(0.25)
+        waited = asyncio.get_running_loop().time() - started
+        if waited >= 1:
+            self.log_metric("build_slot_wait_ms", int(waited * 1000))
+        try:
+            return await func()
+        finally:
+            self.build_slots.release()
+
+    async def verify(self):
+        """Two tiers: incremental type-check first, then the full bundle.
+
+        `enable_typecheck` True makes the check a gate and False turns it off.
+        Unset, it only runs when the build script runs tsc itself: a failed
+        check then skips a build that would fail anyway, and a passed one lets
+        the warm worker bundle without repeating it. Elsewhere the vite build
+        may pass with type errors, so the check would only add latency.
+        """
+        setting = self.config.get('enable_typecheck')
+        if setting is None:
+            setting = build_typechecks(self.repo_dir)
+        command = typecheck_command(self.repo_dir) if setting else None
+        if command is None:
+            return await self._run_build()
+
+        started = asyncio.get_running_loop().time()
+        code, output = await self._exec(*command)
+        self.log_metric("typecheck_ms", int((asyncio.get_running_loop().time() - started) * 1000))
+        if code == 0:
+            return await self._run_build(typechecked=True)
+        self.log_msg("🔎 Type check failed - skipping full build")
+        self.log_metric("typecheck", "failed")
+        return False, first_errors(output)
+
+    async def _run_build(self, typechecked=False):
+        """Build in the shared warm worker if the project allows it, else via npm"""
+        if self.build_worker is not None and self.build_worker.supports(self.repo_dir, typechecked):
+            self.control.worker_builds += 1
+            if self.control.hard:
+                self._suspend_worker(signal.SIGSTOP)
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(None, self.build_worker.build, self.repo_dir)
+            finally:
+                self.control.worker_builds -= 1
+                if self.control.worker_stopped and not self.control.worker_builds:
+                    # Cancelled while suspended: let the worker finish, as the
+                    # executor thread (and the loop's shutdown) waits on it
+                    self._suspend_worker(signal.SIGCONT)
+            if result is not None:
+                self.log_metric("build_ms", int(result['duration'] * 1000))
+                if result['ok']:
+                    self.log_metric("bundle_bytes", sum(chunk['size'] for chunk in result['chunks']))
+                return result['ok'], format_result(result)
+
+        code, output = await self._exec('npm', 'run', 'build')
+        return code == 0, output
+
+    async def model(self, prompt):
+        """One model call; its output goes to the stream, not to agent.log.
+
+        With adaptive pacing the call waits for the call budget, and a
+        throttled call is retried after an exponential backoff.
+        """
+        attempt = 1
+        while True:
+            if self.pacer is not None:
+                wait = self.pacer.acquire()
+                if wait:
+                    self.log_msg(f"⏳ Call budget used up - waiting {wait}s")
+                    await asyncio.sleep(wait)
+
+            code, output = await self.fish(MODEL_COMMAND, env={"SCALESITE_PROMPT": prompt}, stream=True)
+            if self.pacer is None:
+                return code
+
+            backoff = self.pacer.record_call(code, output, attempt, self.config.get('pause_seconds', 240))
+            if backoff is None:
+                return code
+            self.log_msg(f"⏳ Rate limited - retrying in {backoff}s ({attempt}/{self.pacer.max_retries})")
+            self.log_metric("rate_limited", backoff)
+            await asyncio.sleep(backoff)
+            attempt += 1
+
+    def _spawn(self, coro):
+        """Run bookkeeping in the background while the next phase proceeds"""
+        task = asyncio.ensure_future(coro)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+        return task
+
+    # ==========================================
+    # PROMPTS
+    # ==========================================
+
+    def _load_prompt_functions(self):
+        with open(os.path.join(self.repo_dir, self.script_path), 'r') as f:
+            return '\n'.join(PROMPT_FUNCTION_PATTERN.findall(f.read()))
+
+    async def adaptive_prompt(self, phase, loop_num, recent_changes=""):
+        if self.prompt_functions is None:
+            self.prompt_functions = self._load_prompt_functions()
+        command = (
+            f"set MAX_LOOPS {int(self.config['max_loops'])}\n"
+            f"{self.prompt_functions}\n"
+            f'get_adaptive_prompt_{phase} $SCALESITE_LOOP "$SCALESITE_RECENT_CHANGES"'
+        )
+        _, prompt = await self.fish(command, env={
+            "SCALESITE_LOOP": str(loop_num),
+            "SCALESITE_RECENT_CHANGES": recent_changes
+        })
+        return prompt.strip()
+
+    # ==========================================
+    # LOOP STEPS
+    # ==========================================
+
+    async def pre_flight_check(self):
+        self.log_msg("🔍 PRE-FLIGHT CHECK INITIATED...")
+        self.log_msg("")
+
+        # A file, not a directory, in linked worktrees and submodules
+        if not os.path.exists(os.path.join(self.repo_dir, '.git')):
+            self.log_error("Git repository not found!")
+            return False
+        self.log_success("Git repository ✓")
+
+        if shutil.which('npm') is None:
+            self.log_error("npm not found!")
+            return False
+        self.log_success("npm available ✓")
+
+        if shutil.which('fish') is None or (await self.fish('type -q zclaude'))[0] != 0:
+            self.log_error("zclaude function not found! Make sure Fish config is loaded.")
+            return False
+        self.log_success("zclaude function available (Z.ai API) ✓")
+
+        if not os.path.exists(os.path.join(self.repo_dir, 'package.json')):
+            self.log_error("package.json not found!")
+            return False
+        self.log_success("package.json exists ✓")
+
+        self.log_msg("🏗️  Testing initial build...")
+        ok, _ = await self.build()
+        if not ok:
+            self.log_error("Initial build FAILED! Fix manually before starting.")
+            return False
+        self.log_success("Initial build SUCCESS ✓")
+
+        _, branch = await self.git('branch', '--show-current')
+        self.log_success(f"Current branch: {branch.strip()} ✓")
+
+        if (await self.git('diff', '--quiet'))[0] != 0:
+            self.log_msg("⚠️  Uncommitted changes detected - committing...")
+            await self.stage()
+            await self.git('commit', '-m', 'Pre-Loop: Save working state', '--allow-empty')
+            self.log_success("Changes committed ✓")
+
+        # Fresh metrics file (JSON Lines) for this run
+        open(os.path.join(self.repo_dir, self.metrics_file), 'w').close()
+
+        self.log_msg("")
+        self.log_success("PRE-FLIGHT CHECK COMPLETE")
+        self.log_msg("")
+        return True
+
+    async def track_git_stats(self, rev):
+        _, numstat = await self.git('diff', f"{rev}~1", rev, '--numstat')
+        for row in numstat.splitlines():
+            parts = row.split('\t')
+            if len(parts) == 3:
+                self.stats.files_changed += 1
+                self.stats.lines_added += int(parts[0]) if parts[0].isdigit() else 0
+                self.stats.lines_removed += int(parts[1]) if parts[1].isdigit() else 0
+
+    async def check_and_repair(self):
+        self.log_msg("🛠️  Build Check...")
+        ok, output = await self.build()
+        if ok:
+            self.log_success("Build SUCCESS")
+            self.stats.successful_phases += 1
+            return True
+
+        self.log_error("BUILD FAILED! Starting Emergency Repair...")
+        error_log = '\n'.join(output.splitlines()[-50:])
+        prompt = REPAIR_PROMPT.format(error_log=error_log)
+        if int(self.config.get('repair_candidates', 1)) > 1:
+            await self.speculative_repair(prompt)
+        else:
+            await self.model(prompt)
+
+        self.log_msg("🔍 Verifying repair...")
+        ok, _ = await self.build()
+        if ok:
+            self.log_success("Repair SUCCESSFUL!")
+            await self.stage()
+            await self.git('commit', '-m', '🚑 Emergency: Auto-Repair Build', '--allow-empty')
+            self.stats.successful_phases += 1
+            self.log_metric("repair_success", "1")
+            return True
+
+        self.log_error("Repair FAILED. Executing ROLLBACK...")
+        await self.git('stash', 'push', '-m', f"Failed-Repair-{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        await self.git('reset', '--hard', 'HEAD')
+
+        self.stats.failed_repairs += 1
+        self.log_error(f"Failed Repairs: {self.stats.failed_repairs}/{self.config['max_failed_repairs']}")
+        self.log_metric("repair_failed", "1")
+
+        if self.stats.failed_repairs >= self.config['max_failed_repairs']:
+            self.log_error(f"🛑 EMERGENCY STOP: Too many failed repairs ({self.stats.failed_repairs})")
+            self.log_error("System unstable. Aborting.")
+            raise EmergencyStop()
+        return False
+
+    async def run_phase(self, loop_num, phase):
+        await self.wait_if_paused()
+        number, icon, title, commit_title = PHASES[phase - 1]
+        if number > 1:
+            self.log_msg("")
+        self.log_msg(f"{icon} Phase {number}/5: {title}")
+        self.stats.total_phases += 1
+
+        recent_changes = ""
+        if number == 2:
+            _, recent_changes = await self.git('diff', 'HEAD~1', 'HEAD', '--stat')
+        prompt = await self.adaptive_prompt(number, loop_num, recent_changes)
+        await self.model(prompt)
+
+        if await self.check_and_repair():
+            self.stats.phase_success[number] += 1
+            await self.stage()
+            await self.git('commit', '-m', f"Loop {loop_num}/Phase {number}: {commit_title}", '--allow-empty')
+            if self.track_stats:
+                # Pin the commit: HEAD moves on while the stats are collected
+                _, rev = await self.git('rev-parse', 'HEAD')
+                self._spawn(self.track_git_stats(rev.strip()))
+            return True
+        return False
+
+    # ==========================================
+    # WORKTREES
+    # ==========================================
+
+    def _worktree_path(self, name):
+        """Stable location per name, so incremental tsc state carries over loops"""
+        repo_id = hashlib.sha1(os.path.realpath(self.repo_dir).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(tempfile.gettempdir(), f"scalesite-worktrees-{repo_id}", name)
+
+    async def _add_worktree(self, name, base):
+        """Detached worktree at `base`, as an Orchestrator bound to it"""
+        path = self._worktree_path(name)
+        if os.path.exists(path):
+            # Left behind by a killed run
+            await self._remove_worktree(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        code, output = await self.git('worktree', 'add', '--detach', path, base)
+        if code != 0:
+            raise RuntimeError(f"git worktree add failed: {output.strip()}")
+
+        # Ignored files the build needs are shared with the main checkout
+        for name in LINKED_PATHS:
+            source = os.path.join(self.repo_dir, name)
+            if os.path.exists(source) and not os.path.lexists(os.path.join(path, name)):
+                os.symlink(source, os.path.join(path, name))
+
+        child = type(self)(
+            self.config,
+            on_line=self.on_line,
+            repo_dir=path,
+            script_path=os.path.join(self.repo_dir, self.script_path),
+            log_file=os.path.join(self.repo_dir, self.log_file),
+            error_log_file=os.path.join(self.repo_dir, self.error_log_file),
+            metrics_file=os.path.join(self.repo_dir, self.metrics_file),
+            report_file=os.path.join(self.repo_dir, self.report_file),
+            build_cache=self.build_cache,
+            build_worker=self.build_worker,
+            pacer=self.pacer,
+            build_slots=self.build_slots
+        )
+        child.stats = self.stats
+        child.control = self.control
+        child.processes = self.processes
+        child.prompt_functions = self.prompt_functions
+        child.stream_prefix = f"[{name}] "
+        child.stage_excludes = tuple(f":(exclude){name}" for name in LINKED_PATHS)
+        return child
+
+    async def _remove_worktree(self, path):
+        code, _ = await self.git('worktree', 'remove', '--force', path)
+        if code != 0:
+            shutil.rmtree(path, ignore_errors=True)
+            await self.git('worktree', 'prune')
+
+    # ==========================================
+    # SPECULATIVE REPAIR
+    # ==========================================
+
+    async def _snapshot(self):
+        """Commit object for the dirty working tree, without touching HEAD or the index"""
+        tree = await self.working_tree()
+        if not tree:
+            return None
+        code, sha = await self.git('commit-tree', tree, '-p', 'HEAD', '-m', 'Repair base')
+        return sha.strip() if code == 0 else None
+
+    async def _repair_candidate(self, index, base, prompt):
+        """One repair attempt in its own worktree; the fixed commit or None"""
+        child = await self._add_worktree(f"repair-{index}", base)
+        try:
+            await child.model(prompt)
+            ok, _ = await child.build()
+            if not ok:
+                return None
+            await child.stage()
+            await child.git('commit', '-m', f"Repair candidate {index}", '--allow-empty')
+            _, head = await child.git('rev-parse', 'HEAD')
+            return head.strip()
+        finally:
+            await self._remove_worktree(child.repo_dir)
+
+    async def speculative_repair(self, prompt):
+        """Race K repair attempts; apply the first that builds to this checkout.
+
+        Candidates start from a snapshot of the broken working tree. The
+        winner's changes are applied as a patch, so the caller verifies and
+        commits exactly as after a single in-place repair; the verification
+        build is answered by the build cache. Returns True if one passed.
+        """
+        base = await self._snapshot()
+        if base is None:
+            await self.model(prompt)
+            return False
+
+        count = int(self.config['repair_candidates'])
+        self.log_msg(f"🧪 Racing {count} repair candidates...")
+        tasks = [asyncio.ensure_future(self._repair_candidate(index, base, prompt))
+                 for index in range(1, count + 1)]
+        winner = None
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                winner = await next_done
+                if winner:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        if not winner:
+            self.log_metric("repair_candidates_failed", count)
+            return False
+
+        _, patch = await self.git('diff', '--binary', base, winner)
+        fd, patch_path = tempfile.mkstemp(prefix='agent-repair-', suffix='.patch')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(patch)
+            code, output = await self.git('apply', '--whitespace=nowarn', patch_path)
+        finally:
+            os.remove(patch_path)
+        if code != 0:
+            self.log_error(f"Could not apply repair candidate: {output.strip()[:200]}")
+            return False
+        return True
+
+    # ==========================================
+    # PARALLEL PHASES
+    # ==========================================
+
+    async def _run_isolated(self, loop_num, number, base, limit):
+        """One phase in its own worktree; returns (ok, head sha)"""
+        async with limit:
+            child = await self._add_worktree(f"phase-{number}", base)
+            # Counted by merge_phase, once the phase has landed
+            child.track_stats = False
+            try:
+                ok = await child.run_phase(loop_num, number)
+                await asyncio.gather(*child.background, return_exceptions=True)
+                _, head = await child.git('rev-parse', 'HEAD')
+                return ok, head.strip()
+            finally:
+                # Commits stay in the shared object store for the merge
+                await self._remove_worktree(child.repo_dir)
+
+    async def merge_phase(self, number, base, head, verify):
+        """Cherry-pick a phase's commits onto HEAD; False on conflict.
+
+        A textual conflict aborts the pick. With `verify`, a clean pick that
+        breaks the build of the combined tree is undone as well.
+        """
+        _, before = await self.git('rev-parse', 'HEAD')
+        code, _ = await self.git('cherry-pick', '--allow-empty', '--keep-redundant-commits', f"{base}..{head}")
+        if code != 0:
+            await self.git('cherry-pick', '--abort')
+            self.log_error(f"Phase {number} conflicts with the merged phases")
+            return False
+        if verify:
+            ok, _ = await self.build()
+            if not ok:
+                await self.git('reset', '--hard', before.strip())
+                self.log_error(f"Phase {number} breaks the build of the merged phases")
+                return False
+        self.log_success(f"Phase {number} merged")
+        _, rev = await self.git('rev-parse', 'HEAD')
+        self._spawn(self.track_git_stats(rev.strip()))
+        return True
+
+    async def run_phases_parallel(self, loop_num):
+        """Phases 1-5 in worktrees off the same base, merged back in phase order.
+
+        A phase that conflicts with the phases merged before it is re-run on
+        the merged base before any later phase is merged. As in sequential
+        mode nothing lands after a failed phase (or failed re-run): the later
+        phases ran anyway, but are discarded and counted as skipped. Returns
+        the phase numbers that failed.
+        """
+        _, base = await self.git('rev-parse', 'HEAD')
+        base = base.strip()
+        if self.prompt_functions is None:
+            self.prompt_functions = self._load_prompt_functions()
+        width = int(self.config['parallel_phases'])
+        self.log_msg(f"🔀 Parallel phases: {width} worktrees from {base[:7]}")
+
+        limit = asyncio.Semaphore(width)
+        tasks = [asyncio.ensure_future(self._run_isolated(loop_num, number, base, limit))
+                 for number in range(1, 6)]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        self.log_msg("")
+        failed = []
+        merged = 0
+        for number, (ok, head) in enumerate(results, 1):
+            if failed:
+                # Counted by the worktree run; it is dropped unmerged
+                self.stats.total_phases -= 1
+                if ok:
+                    self.stats.phase_success[number] -= 1
+                    self.stats.successful_phases -= 1
+                self.stats.skipped_phases += 1
+            elif not ok:
+                failed.append(number)
+            elif await self.merge_phase(number, base, head, verify=merged > 0):
+                merged += 1
+            else:
+                # Counted by the worktree run, which did not land; the second
+                # attempt is counted by run_phase instead
+                self.stats.phase_success[number] -= 1
+                self.stats.successful_phases -= 1
+                self.stats.total_phases -= 1
+                self.log_msg(f"🔁 Re-running phase {number} on the merged base")
+                if await self.run_phase(loop_num, number):
+                    merged += 1
+                else:
+                    failed.append(number)
+        return failed
+
+    async def create_milestone(self, loop_num):
+        tag_name = f"loop-milestone-{loop_num}"
+        tag_message = f"Milestone: Loop {loop_num} completed | {self.stats.successful_phases} successful phases"
+        code, _ = await self.git('tag', '-a', tag_name, '-m', tag_message)
+        if code == 0:
+            self.log_success(f"Git Tag created: {tag_name}")
+            self.log_metric("milestone", loop_num)
+
+    async def log_summary(self, loop_num, commits_session):
+        max_loops = self.config['max_loops']
+        self.log_msg("")
+        self.log_msg(RULE)
+        self.log_msg(f"📊 ROUND SUMMARY - Loop {loop_num}/{max_loops}")
+        self.log_msg(RULE)
+        self.log_msg(f"📍 Progress: {round(loop_num * 100 / max_loops)}% complete")
+        if self.stats.total_phases > 0:
+            success_rate = round(self.stats.successful_phases * 100 / self.stats.total_phases)
+            self.log_msg(f"✅ Success Rate: {success_rate}% ({self.stats.successful_phases}/{self.stats.total_phases} phases)")
+        s = self.stats.phase_success
+        self.log_msg(f"📦 Phase Success: QA={s[1]} | Design={s[2]} | Perf={s[3]} | Sec={s[4]} | Clean={s[5]}")
+
+        # Started right after phase 5, so it ran alongside the checkpoint build
+        _, commits = await commits_session
+        self.log_msg(f"💾 Commits (Session): {commits.strip()}")
+        self.log_msg(f"📝 Total Changes: +{self.stats.lines_added} -{self.stats.lines_removed} lines, {self.stats.files_changed} files")
+        if self.stats.failed_repairs > 0:
+            self.log_msg(f"⚠️  Failed Repairs: {self.stats.failed_repairs}/{self.config['max_failed_repairs']}")
+        self.log_msg(RULE)
+        self.log_msg("")
+
+    async def run_loop(self, loop_num):
+        await self.wait_if_paused()
+        self.log_msg("")
+        self.log_msg("╔═══════════════════════════════════════════════╗")
+        self.log_msg(f"║  🔄 LOOP {loop_num} of {self.config['max_loops']}")
+        self.log_msg("╚═══════════════════════════════════════════════╝")
+        self.log_msg("")
+
+        if int(self.config.get('parallel_phases', 1)) > 1:
+            failed = await self.run_phases_parallel(loop_num)
+            blocking = [number for number in failed if number < 5]
+            if blocking:
+                self.log_error(f"Phase {', '.join(map(str, blocking))} failed - skipping rest of loop {loop_num}")
+                return
+            if failed:
+                self.log_error("Phase 5 failed - continuing to next loop")
+        else:
+            for phase in range(1, 6):
+                if await self.run_phase(loop_num, phase):
+                    continue
+                if phase < 5:
+                    self.log_error(f"Phase {phase} failed - skipping rest of loop {loop_num}")
+                    self.stats.skipped_phases += 5 - phase
+                    return
+                self.log_error("Phase 5 failed - continuing to next loop")
+
+        commits_session = self._spawn(self.git('rev-list', '--count', 'HEAD', '--since=6 hours ago'))
+
+        if loop_num % self.config['milestone_interval'] == 0:
+            self.log_msg("")
+            self.log_msg(f"🏆 MILESTONE REACHED: Loop {loop_num}")
+            await self.create_milestone(loop_num)
+
+        if loop_num % self.config['checkpoint_interval'] == 0:
+            self.log_msg("")
+            self.log_msg(f"🔍 ═══ CHECKPOINT {loop_num} ═══")
+            self.log_msg("Running Extended Validation...")
+            ok, _ = await self.build()
+            if ok:
+                self.log_success("Checkpoint Build: PASSED")
+                self.log_metric(f"checkpoint_{loop_num}", "passed")
+            else:
+                self.log_error("Checkpoint Build: FAILED")
+                self.log_metric(f"checkpoint_{loop_num}", "failed")
+
+        self.log_msg("")
+        await self.log_summary(loop_num, commits_session)
+
+        self.log_msg("")
+        self.log_success(f"Loop {loop_num} complete (5/5 phases)")
+        if loop_num < self.config['max_loops']:
+            if self.pacer is not None:
+                pause = self.pacer.loop_pause(self.config['pause_seconds'])
+            else:
+                pause = self.config['pause_seconds']
+            self.log_msg(f"☕ Pause for {pause} seconds...")
+            self.log_msg("")
+            self.log_metric("pause", pause)
+            await asyncio.sleep(pause)
+
+    async def final_report(self, status_type="success"):
+        end_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        _, total_commits = await self.git('rev-list', '--count', 'HEAD', '--since=8 hours ago')
+        total_commits = total_commits.strip()
+
+        self.log_msg("")
+        self.log_msg(RULE)
+        self.log_msg("🎉 FINAL REPORT")
+        self.log_msg(RULE)
+        self.log_msg(f"🏁 End Time: {end_time}")
+        self.log_msg(f"🔄 Loops Completed: {self.config['max_loops']}")
+        self.log_msg(f"📦 Total Phases: {self.stats.total_phases}")
+        self.log_msg(f"✅ Successful Phases: {self.stats.successful_phases}")
+        if self.stats.total_phases > 0:
+            self.log_msg(f"📊 Final Success Rate: {self.success_rate()}%")
+        self.log_msg("")
+        self.log_msg("📈 Phase Breakdown:")
+        for number, icon, _, commit_title in PHASES:
+            self.log_msg(f"   {icon} {commit_title}: {self.stats.phase_success[number]}")
+        self.log_msg("")
+        self.log_msg("📝 Code Statistics:")
+        self.log_msg(f"   💾 Total Commits: {total_commits}")
+        self.log_msg(f"   📝 Lines Added: +{self.stats.lines_added}")
+        self.log_msg(f"   📝 Lines Removed: -{self.stats.lines_removed}")
+        self.log_msg(f"   📁 Files Changed: {self.stats.files_changed}")
+        if self.stats.failed_repairs > 0:
+            self.log_msg("")
+            self.log_msg(f"⚠️  Total Failed Repairs: {self.stats.failed_repairs}")
+        self.log_msg(RULE)
+        self.log_msg("")
+
+        self.generate_html_report(status_type, total_commits, end_time)
+
+    def success_rate(self):
+        if self.stats.total_phases == 0:
+            return 0
+        return round(self.stats.successful_phases * 100 / self.stats.total_phases)
+
+    def generate_html_report(self, status_type, total_commits, end_time):
+        if not self.config.get('enable_html_report', True):
+            return
+        s = self.stats.phase_success
+        with open(os.path.join(self.repo_dir, self.report_file), 'w') as f:
+            f.write(REPORT_TEMPLATE.format(
+                status=status_type,
+                total_phases=self.stats.total_phases,
+                success_rate=self.success_rate(),
+                successful_phases=self.stats.successful_phases,
+                total_commits=total_commits,
+                lines_added=self.stats.lines_added,
+                lines_removed=self.stats.lines_removed,
+                files_changed=self.stats.files_changed,
+                qa=s[1], design=s[2], performance=s[3], security=s[4], cleanup=s[5],
+                end_time=end_time
+            ))
+        self.log_success(f"HTML Report generated: {self.report_file}")
+
+    # ==========================================
+    # RUN CONTROL
+    # ==========================================
+
+    async def run(self):
+        """Whole run; returns 0 on success and 1 on abort, like the fish script"""
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        # Stopped before the loop existed: stop() could not cancel the task
+        if self.cancel_requested:
+            raise asyncio.CancelledError()
+        if self.build_cache is not None:
+            self.build_cache.forget_failures()
+        if self.owns_pacer:
+            self.pacer.reset(self.config.get('pause_seconds', 240))
+        self.control.resumed = asyncio.Event()
+        self.control.resumed.set()
+        try:
+            if not await self.pre_flight_check():
+                self.on_line("❌ Pre-Flight Check failed. Aborting.\n")
+                return 1
+
+            start_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.log_msg(RULE)
+            self.log_msg("🚀 SCALESITE PRO-LOOP v2.0 (Python orchestrator)")
+            self.log_msg(RULE)
+            self.log_msg("⚙️  Configuration:")
+            self.log_msg(f"   • Max Loops: {self.config['max_loops']}")
+            self.log_msg("   • Phases per Loop: 5 (Adaptive Prompts)")
+            if self.pacer is not None:
+                self.log_msg(f"   • Pause: adaptive (backoff from {self.config['pause_seconds']} seconds)")
+            else:
+                self.log_msg(f"   • Pause: {self.config['pause_seconds']} seconds")
+            self.log_msg(f"   • Checkpoints: Every {self.config['checkpoint_interval']} loops")
+            self.log_msg(f"   • Milestones: Every {self.config['milestone_interval']} loops")
+            self.log_msg(f"   • HTML Report: {str(self.config.get('enable_html_report', True)).lower()}")
+            self.log_msg(f"🕐 Start Time: {start_time}")
+            self.log_msg(RULE)
+            self.log_msg("")
+
+            try:
+                for loop_num in range(1, self.config['max_loops'] + 1):
+                    await self.run_loop(loop_num)
+            except EmergencyStop:
+                await asyncio.gather(*self.background, return_exceptions=True)
+                self.generate_html_report("emergency_stop", "", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+                return 1
+
+            await asyncio.gather(*self.background, return_exceptions=True)
+            self.log_msg("")
+            await self.final_report()
+            self.log_success("🎉 PRO-LOOP COMPLETED!")
+            return 0
+        finally:
+            for process in list(self.processes):
+                self._kill(process)
+
+    def stop(self):
+        """Thread-safe: cancel the run and terminate running subprocesses"""
+        # Seen by run() if it has not set up its loop yet
+        self.cancel_requested = True
+        if self.loop is None or self.task is None:
+            return
+        self.loop.call_soon_threadsafe(self.task.cancel)
+
+    # ==========================================
+    # PAUSE / RESUME
+    # ==========================================
+
+    async def wait_if_paused(self):
+        """Phase boundary: hold here while a pause is requested"""
+        if self.control.resumed is None or self.control.resumed.is_set():
+            return
+        self.log_msg("⏸️  Paused at phase boundary")
+        await self.control.resumed.wait()
+
+    def pause(self, hard=False):
+        """Thread-safe: hold the run at the next phase boundary.
+
+        `hard` also suspends every running subprocess group (model call,
+        build, git) with SIGSTOP, so they give back CPU right away.
+        """
+        if self.loop is None or self.control.resumed is None:
+            return False
+        self.loop.call_soon_threadsafe(self._pause, hard)
+        return True
+
+    def resume(self):
+        """Thread-safe: continue suspended processes and release the hold"""
+        if self.loop is None or self.control.resumed is None:
+            return False
+        self.loop.call_soon_threadsafe(self._resume)
+        return True
+
+    def _pause(self, hard):
+        control = self.control
+        if not control.requested:
+            control.requested = True
+            control.since = time.monotonic()
+            control.resumed.clear()
+        if hard and not control.hard:
+            control.hard = True
+            for process in list(self.processes):
+                self._kill(process, signal.SIGSTOP)
+            if control.worker_builds:
+                self._suspend_worker(signal.SIGSTOP)
+            self.log_msg(f"⏸️  Suspended agent processes ({len(self.processes)} running)")
+
+    def _resume(self):
+        control = self.control
+        if not control.requested:
+            return
+        if control.hard:
+            control.hard = False
+            for process in list(self.processes):
+                self._kill(process, signal.SIGCONT)
+            if control.worker_stopped:
+                self._suspend_worker(signal.SIGCONT)
+        paused_for = time.monotonic() - control.since
+        control.total += paused_for
+        control.requested = False
+        control.since = None
+        control.resumed.set()
+        self.log_msg(f"▶️  Resumed after {round(paused_for)} seconds")
+        self.log_metric("paused_seconds", round(paused_for))
+
+    def _suspend_worker(self, sig):
+        """SIGSTOP/SIGCONT the warm build worker while this run has a build in it.
+
+        The worker is shared by all jobs, so it is only stopped while one of
+        our builds is in it or queued on its lock, and continued on resume.
+        """
+        self.build_worker.signal(sig)
+        self.control.worker_stopped = sig == signal.SIGSTOP
+
+    def pause_status(self):
+        return self.control.status()
+
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html lang='en'>
+<head>
+    <meta charset='UTF-8'>
+    <meta name='viewport' content='width=device-width, initial-scale=1.0'>
+    <title>Scalesite Agent Report</title>
+    <style>
+        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
+        body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, sans-serif; background: #0a0a0a; color: #fff; padding: 40px 20px; }}
+        .container {{ max-width: 1200px; margin: 0 auto; }}
+        .header {{ text-align: center; margin-bottom: 60px; }}
+        .header h1 {{ font-size: 48px; margin-bottom: 10px; background: linear-gradient(135deg, #4B5AED 0%, #8B5CF6 100%); -webkit-background-clip: text; -webkit-text-fill-color: transparent; }}
+        .header p {{ color: #888; font-size: 18px; }}
+        .status {{ display: inline-block; padding: 8px 16px; border-radius: 20px; font-weight: 600; margin-top: 20px; }}
+        .status.success {{ background: #10B981; color: white; }}
+        .status.emergency_stop {{ background: #EF4444; color: white; }}
+        .grid {{ display: grid; grid-template-columns: repeat(auto-fit, minmax(280px, 1fr)); gap: 24px; margin-bottom: 40px; }}
+        .card {{ background: #1a1a1a; border: 1px solid #333; border-radius: 12px; padding: 24px; }}
+        .card h3 {{ font-size: 14px; color: #888; text-transform: uppercase; letter-spacing: 1px; margin-bottom: 12px; }}
+        .card .value {{ font-size: 36px; font-weight: 700; color: #fff; }}
+        .card .subvalue {{ font-size: 14px; color: #666; margin-top: 8px; }}
+        .phase-grid {{ display: grid; grid-template-columns: repeat(5, 1fr); gap: 12px; margin-top: 20px; }}
+        .phase {{ background: #2a2a2a; border-radius: 8px; padding: 16px; text-align: center; }}
+        .phase .name {{ font-size: 12px; color: #888; margin-bottom: 8px; }}
+        .phase .count {{ font-size: 24px; font-weight: 700; }}
+        .footer {{ text-align: center; margin-top: 60px; color: #666; font-size: 14px; }}
+    </style>
+</head>
+<body>
+    <div class='container'>
+        <div class='header'>
+            <h1>🚀 Scalesite Agent Report</h1>
+            <p>Autonomous Development Loop Results</p>
+            <div class='status {status}'>{status}</div>
+        </div>
+        <div class='grid'>
+            <div class='card'><h3>Total Phases</h3><div class='value'>{total_phases}</div><div class='subvalue'>Executed phases</div></div>
+            <div class='card'><h3>Success Rate</h3><div class='value'>{success_rate}%</div><div class='subvalue'>{successful_phases} successful</div></div>
+            <div class='card'><h3>Total Commits</h3><div class='value'>{total_commits}</div><div class='subvalue'>Last 8 hours</div></div>
+            <div class='card'><h3>Code Changes</h3><div class='value' style='color: #10B981'>+{lines_added}</div><div class='value' style='color: #EF4444'>-{lines_removed}</div><div class='subvalue'>{files_changed} files changed</div></div>
+        </div>
+        <div class='card'>
+            <h3>Phase Breakdown</h3>
+            <div class='phase-grid'>
+                <div class='phase'><div class='name'>🐞 QA</div><div class='count'>{qa}</div></div>
+                <div class='phase'><div class='name'>🎨 Design</div><div class='count'>{design}</div></div>
+                <div class='phase'><div class='name'>⚡ Performance</div><div class='count'>{performance}</div></div>
+                <div class='phase'><div class='name'>🔒 Security</div><div class='count'>{security}</div></div>
+                <div class='phase'><div class='name'>🧹 Cleanup</div><div class='count'>{cleanup}</div></div>
+            </div>
+        </div>
+        <div class='footer'>
+            <p>Generated on {end_time}</p>
+            <p>Scalesite Autonomous Agent © 2026</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
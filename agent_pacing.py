@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Adaptive pause scheduler
+Paces model calls with a token bucket and backs off only on rate-limit signals
+"""
+
+import random
+import re
+import threading
+import time
+
+# API errors as printed by the CLI; matched anywhere in a call's output
+API_LIMIT_PATTERN = re.compile(
+    r'API Error:?\s*(?:429|529)|rate_limit_error|overloaded_error', re.IGNORECASE
+)
+
+# Looser phrases, only trusted when the call also exited non-zero - model
+# output may legitimately talk about rate limiting (e.g. in phase 4)
+EXIT_LIMIT_PATTERN = re.compile(
+    r'rate.?limit|too many requests|overloaded|\b429\b|\b529\b|quota exceeded|usage limit',
+    re.IGNORECASE
+)
+
+# Only the end of a failed call's output is searched for the looser phrases
+TAIL_CHARS = 2000
+
+
+def is_rate_limited(exit_code, output):
+    """True if a model call's exit status and output indicate throttling"""
+    if API_LIMIT_PATTERN.search(output):
+        return True
+    return exit_code != 0 and EXIT_LIMIT_PATTERN.search(output[-TAIL_CHARS:]) is not None
+
+
+class PauseScheduler:
+    """Decides how long to wait between model calls and between loops.
+
+    A token bucket (`burst` calls, refilled at `calls_per_minute`) smooths
+    the call rate. Each throttled call adds a strike and backs off
+    exponentially from `base_pause` (with jitter, capped at `max_pause`);
+    each clean call removes one. The inter-loop pause is zero while there
+    are no strikes, so a healthy run never sleeps for nothing.
+    """
+
+    def __init__(self, base_pause=240, max_pause=1800, calls_per_minute=4.0, burst=10,
+                 max_retries=3, clock=time.monotonic):
+        self.base_pause = base_pause
+        self.max_pause = max_pause
+        self.calls_per_minute = calls_per_minute
+        self.burst = burst
+        self.max_retries = max_retries
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self, base_pause=None):
+        with self.lock:
+            if base_pause is not None:
+                self.base_pause = base_pause
+            self.tokens = float(self.burst)
+            self.refilled_at = self.clock()
+            self.strikes = 0
+            self.signals = 0
+            self.calls = 0
+            self.total_waited = 0.0
+            self.last_wait = None
+            self.waiting_until = None
+
+    def _refill(self, now):
+        rate = self.calls_per_minute / 60.0
+        self.tokens = min(float(self.burst), self.tokens + (now - self.refilled_at) * rate)
+        self.refilled_at = now
+
+    def _backoff(self, base_pause=None):
+        if base_pause is None:
+            base_pause = self.base_pause
+        delay = base_pause * 2 ** (self.strikes - 1)
+        return round(min(self.max_pause, delay) * random.uniform(0.8, 1.0))
+
+    def _waiting(self, seconds, reason):
+        """Record a chosen wait for the dashboard; returns it unchanged"""
+        self.last_wait = {"seconds": seconds, "reason": reason, "at": time.time()}
+        self.waiting_until = time.time() + seconds if seconds else None
+        self.total_waited += seconds
+        return seconds
+
+    def acquire(self):
+        """Take a token for one model call; seconds to wait before making it"""
+        with self.lock:
+            now = self.clock()
+            self._refill(now)
+            self.tokens -= 1
+            self.calls += 1
+            if self.tokens >= 0:
+                return 0
+            wait = round(-self.tokens / (self.calls_per_minute / 60.0))
+            return self._waiting(wait, "call budget")
+
+    def record_call(self, exit_code, output, attempt=1, base_pause=None):
+        """Feed back one call's result; seconds to back off before a retry, or None.
+
+        `base_pause` overrides the scheduler's own for callers sharing it.
+        """
+        with self.lock:
+            if not is_rate_limited(exit_code, output):
+                self.strikes = max(self.strikes - 1, 0)
+                return None
+            self.signals += 1
+            self.strikes += 1
+            # The bucket was optimistic; start refilling from empty
+            self.tokens = min(self.tokens, 0.0)
+            if attempt > self.max_retries:
+                return None
+            return self._waiting(self._backoff(base_pause), "rate limited")
+
+    def loop_pause(self, base_pause=None):
+        """Seconds to pause after a loop: zero unless throttling was seen"""
+        with self.lock:
+            if self.strikes == 0:
+                return self._waiting(0, "no rate limits")
+            return self._waiting(self._backoff(base_pause), f"{self.strikes} recent rate limit signal(s)")
+
+    def snapshot(self):
+        with self.lock:
+            self._refill(self.clock())
+            return {
+                "tokens": round(self.tokens, 2),
+                "burst": self.burst,
+                "calls_per_minute": self.calls_per_minute,
+                "strikes": self.strikes,
+                "signals": self.signals,
+                "calls": self.calls,
+                "total_waited": round(self.total_waited, 1),
+                "last_wait": self.last_wait,
+                "waiting_until": self.waiting_until
+            }
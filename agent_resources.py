@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Resource sampler
+Samples CPU, memory, I/O and process count of the agent's process tree from /proc
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from agent_events import LOOP_START, PHASE_START
+
+PROC = "/proc"
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+MB = 1024 * 1024
+
+
+def _stat_fields(pid):
+    """Fields of /proc/<pid>/stat after the command name, or None if gone"""
+    try:
+        with open(f"{PROC}/{pid}/stat", 'r') as f:
+            data = f.read()
+    except OSError:
+        return None
+    # The command name is in parentheses and may itself contain spaces
+    return data[data.rfind(')') + 2:].split()
+
+
+def read_stat(pid):
+    """(ppid, cpu seconds, rss bytes) from /proc/<pid>/stat, or None if gone.
+
+    CPU includes cutime/cstime: the time of children the process has already
+    waited for, so short-lived tsc or git runs between samples still count.
+    """
+    fields = _stat_fields(pid)
+    if fields is None:
+        return None
+    try:
+        cpu = sum(int(value) for value in fields[11:15]) / CLOCK_TICKS
+        return int(fields[1]), cpu, int(fields[21]) * PAGE_SIZE
+    except (IndexError, ValueError):
+        return None
+
+
+def read_child_cpu(pid):
+    """cutime + cstime seconds of a process (its waited-for children), or None"""
+    fields = _stat_fields(pid)
+    if fields is None:
+        return None
+    try:
+        return sum(int(value) for value in fields[13:15]) / CLOCK_TICKS
+    except (IndexError, ValueError):
+        return None
+
+
+def read_io(pid):
+    """(read bytes, write bytes) from /proc/<pid>/io; zeros where not permitted"""
+    values = {}
+    try:
+        with open(f"{PROC}/{pid}/io", 'r') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                values[name] = int(value)
+    except (OSError, ValueError):
+        pass
+    return values.get('read_bytes', 0), values.get('write_bytes', 0)
+
+
+def descendants(root):
+    """{pid: (ppid, cpu, rss)} for every live process below `root`"""
+    stats = {}
+    children = {}
+    for name in os.listdir(PROC):
+        if name.isdigit():
+            stat = read_stat(int(name))
+            if stat is not None:
+                stats[int(name)] = stat
+                children.setdefault(stat[0], []).append(int(name))
+
+    tree = {}
+    pending = list(children.get(root, []))
+    while pending:
+        pid = pending.pop()
+        tree[pid] = stats[pid]
+        pending.extend(children.get(pid, []))
+    return tree
+
+
+class ResourceSampler:
+    """Background sampler for everything the control panel spawned.
+
+    Every `interval` seconds it walks the descendants of `root` (fish, the
+    model CLI, npm, tsc, vite, the warm build worker) and records CPU use,
+    resident memory, disk I/O and process count. CPU and I/O counters are
+    cumulative per process, so each pid's last reading is kept and only the
+    growth since the previous sample is attributed to the loop and phase
+    taken from the output stream; `start_run()` takes the first reading, so
+    long-lived processes such as the build worker start from zero. A process
+    that lives shorter than one interval is seen through its parent's
+    counters for waited-for children; for direct children of `root` that is
+    the root's cutime/cstime and I/O, so the panel's own disk I/O (agent.log)
+    counts in as well, but not its own CPU. Runs of other jobs are counted in too.
+    """
+
+    def __init__(self, root=None, interval=2.0, max_points=900):
+        self.root = root or os.getpid()
+        self.interval = interval
+        self.available = os.path.isdir(f"{PROC}/{self.root}")
+        self.lock = threading.Lock()
+        self.series = deque(maxlen=max_points)
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.reset()
+
+    def reset(self):
+        self.seen = {}
+        self.by_phase = {}
+        self.loop = 0
+        self.phase = 0
+        self.rss_peak = 0
+        self.cpu_total = 0.0
+        self.sampled_at = None
+
+    def start_run(self):
+        baseline = self._read_tree()[0] if self.available else {}
+        with self.lock:
+            self.reset()
+            self.series.clear()
+            self.seen = baseline
+            self.sampled_at = time.monotonic()
+        if self.available and self.thread is None:
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def end_run(self):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join(timeout=self.interval + 1)
+            self.thread = None
+
+    def observe(self, event):
+        """Track the loop and phase that samples are attributed to"""
+        if event is None:
+            return
+        with self.lock:
+            if event.kind == LOOP_START:
+                self.loop = event.number
+                self.phase = 0
+            elif event.kind == PHASE_START:
+                self.phase = event.number
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Error sampling resources: {e}")
+
+    def _read_tree(self):
+        """({pid: (cpu, read, write, ppid)}, tree) for root and the processes below it.
+
+        Root's CPU reading is only that of its reaped children; `tree`, which
+        memory and the process count come from, leaves root out.
+        """
+        tree = descendants(self.root)
+        readings = {}
+        for pid, (ppid, cpu, _) in tree.items():
+            readings[pid] = (cpu,) + read_io(pid) + (ppid,)
+        child_cpu = read_child_cpu(self.root)
+        if child_cpu is not None:
+            readings[self.root] = (child_cpu,) + read_io(self.root) + (None,)
+        return readings, tree
+
+    def sample(self):
+        """Take one sample of the process tree and attribute the deltas"""
+        readings, tree = self._read_tree()
+        rss = sum(stat[2] for stat in tree.values())
+
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.sampled_at if self.sampled_at is not None else self.interval
+            self.sampled_at = now
+
+            cpu = read = write = 0
+            for pid, reading in readings.items():
+                # A recycled pid starts below its predecessor's counters
+                last = self.seen.get(pid, (0, 0, 0, None))
+                if reading[0] < last[0]:
+                    last = (0, 0, 0, None)
+                cpu += reading[0] - last[0]
+                read += max(reading[1] - last[1], 0)
+                write += max(reading[2] - last[2], 0)
+            for pid, last in self.seen.items():
+                if pid not in readings and last[3] in readings:
+                    # Reaped by a sampled parent, whose cutime and I/O counters
+                    # now hold all of its usage; the part up to the last sample
+                    # was counted
+                    cpu -= last[0]
+                    read -= last[1]
+                    write -= last[2]
+            cpu = max(cpu, 0)
+            read = max(read, 0)
+            write = max(write, 0)
+            self.seen = readings
+            self.cpu_total += cpu
+            self.rss_peak = max(self.rss_peak, rss)
+
+            point = {
+                "timestamp": time.time(),
+                "loop": self.loop,
+                "phase": self.phase,
+                "cpu_percent": round(cpu / elapsed * 100, 1) if elapsed > 0 else 0.0,
+                "rss_mb": round(rss / MB, 1),
+                "read_bytes": read,
+                "write_bytes": write,
+                "processes": len(tree)
+            }
+            self.series.append(point)
+
+            key = f"{self.loop}.{self.phase}"
+            totals = self.by_phase.setdefault(key, {
+                "loop": self.loop, "phase": self.phase, "cpu_seconds": 0.0,
+                "rss_peak_mb": 0.0, "read_bytes": 0, "write_bytes": 0, "max_processes": 0
+            })
+            totals["cpu_seconds"] = round(totals["cpu_seconds"] + cpu, 2)
+            totals["rss_peak_mb"] = max(totals["rss_peak_mb"], point["rss_mb"])
+            totals["read_bytes"] += read
+            totals["write_bytes"] += write
+            totals["max_processes"] = max(totals["max_processes"], len(tree))
+            return point
+
+    def snapshot(self, points=None):
+        """Time series (last `points` samples) plus per loop/phase totals"""
+        with self.lock:
+            series = list(self.series)
+            return {
+                "available": self.available,
+                "interval": self.interval,
+                "cpu_seconds": round(self.cpu_total, 2),
+                "rss_peak_mb": round(self.rss_peak / MB, 1),
+                "series": series[-points:] if points else series,
+                "by_phase": list(self.by_phase.values())
+            }
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Server modes
+Runs the control panels on Werkzeug threads (default) or on a gevent event loop
+
+Set AGENT_SERVER_MODE=gevent (requires gevent; gevent-websocket for the
+WebSocket transport, otherwise Socket.IO falls back to long-polling) to serve
+every connection from one event loop. Import this module before anything
+else: in gevent mode it monkey-patches the standard library, so threads,
+queues and sockets in the agent modules become cooperative. The
+orchestrator's asyncio loops are the exception: asyncio allows one running
+loop per OS thread and every greenlet shares the main one, so each run gets
+a real OS thread from gevent's thread pool (run_native), which grows so a
+run never waits behind another. subprocess, os and signal stay
+unpatched because gevent's child watchers only work on the main thread's
+loop; the few short git calls made from request handlers block it briefly.
+asyncio's own child watcher waits in a thread - a greenlet, once threading
+is patched, whose blocking waitpid() would stall the run's loop until the
+child exits (and forever once the child fills its pipe) - so its waitpid()
+threads are started as real OS threads instead.
+
+Capacity (gevent mode): at most AGENT_MAX_CONNECTIONS concurrent connections
+(default 1000) - SSE streams, Socket.IO sockets and plain requests alike.
+An idle stream is one parked greenlet plus its socket buffers, tens of KB,
+where threading mode parks a whole OS thread per client. The open-file limit
+is raised to fit the pool at startup; if the hard limit is lower, that
+limit (minus headroom for logs, pipes and git) is the real capacity.
+"""
+
+import os
+
+SERVER_MODE = os.environ.get("AGENT_SERVER_MODE", "threading").lower()
+MAX_CONNECTIONS = int(os.environ.get("AGENT_MAX_CONNECTIONS", "1000"))
+
+# File descriptors kept free for logs, pipes, SQLite and git subprocesses
+FD_HEADROOM = 256
+
+if SERVER_MODE == "gevent":
+    try:
+        from gevent import monkey
+        monkey.patch_all(subprocess=False, os=False, signal=False)
+    except ImportError:
+        print("Error starting gevent mode: gevent is not installed, using threading")
+        SERVER_MODE = "threading"
+elif SERVER_MODE != "threading":
+    print(f"Error: unknown AGENT_SERVER_MODE '{SERVER_MODE}', using threading")
+    SERVER_MODE = "threading"
+
+
+def install_child_watcher():
+    """Child watcher for asyncio loops on run_native threads (gevent mode)"""
+    import asyncio
+    import warnings
+    if not hasattr(asyncio, 'set_child_watcher'):
+        # Python 3.14+: loops watch children themselves (pidfd where available)
+        return
+
+    start_new_thread = monkey.get_original('_thread', 'start_new_thread')
+
+    class NativeThreadChildWatcher(asyncio.ThreadedChildWatcher):
+        """ThreadedChildWatcher whose waitpid() threads are OS threads"""
+
+        def add_child_handler(self, pid, callback, *args):
+            loop = asyncio.get_running_loop()
+            # _do_waitpid() pops the entry once the child is reaped
+            self._threads[pid] = None
+            start_new_thread(self._do_waitpid, (loop, pid, callback, args))
+
+        def __del__(self):
+            # The base class checks is_alive() on Thread objects it never got
+            pass
+
+    with warnings.catch_warnings():
+        # Child watchers are deprecated from 3.12, but still consulted there
+        warnings.simplefilter('ignore', DeprecationWarning)
+        asyncio.set_child_watcher(NativeThreadChildWatcher())
+
+
+if SERVER_MODE == "gevent":
+    install_child_watcher()
+
+
+def raise_fd_limit(wanted):
+    """Lift the soft open-file limit towards `wanted`; returns the resulting limit"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        target = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        if target > soft:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            return target
+        return soft
+    except (ImportError, ValueError, OSError) as e:
+        print(f"Error raising open file limit: {e}")
+        return None
+
+
+def capacity():
+    """Concurrent connections the server will accept in the current mode"""
+    if SERVER_MODE != "gevent":
+        return None
+    limit = raise_fd_limit(MAX_CONNECTIONS + FD_HEADROOM)
+    if limit is None:
+        return MAX_CONNECTIONS
+    return max(min(MAX_CONNECTIONS, limit - FD_HEADROOM), 1)
+
+
+def run_native(func, *args):
+    """Call func(*args) on a real OS thread and return its result.
+
+    In gevent mode the call goes to the hub's thread pool and only the calling
+    greenlet waits; in threading mode the caller already is an OS thread.
+    """
+    if SERVER_MODE != "gevent":
+        return func(*args)
+    from gevent import get_hub
+    pool = get_hub().threadpool
+    # Calls such as a whole orchestrator run hold their thread until done
+    if len(pool) >= pool.maxsize:
+        pool.maxsize = len(pool) + 1
+    return pool.apply(func, args)
+
+
+def serve(app, host='0.0.0.0', port=5000, socketio=None):
+    """Serve a Flask app (wrapped by Flask-SocketIO if `socketio` is given)"""
+    if SERVER_MODE != "gevent":
+        if socketio is not None:
+            socketio.run(app, host=host, port=port, debug=False, allow_unsafe_werkzeug=True)
+        else:
+            app.run(host=host, port=port, debug=False, threaded=True)
+        return
+
+    from gevent.pool import Pool
+    from gevent.pywsgi import WSGIServer
+
+    handler_class = None
+    if socketio is not None:
+        try:
+            from geventwebsocket.handler import WebSocketHandler
+            handler_class = WebSocketHandler
+        except ImportError:
+            print("gevent-websocket not installed: Socket.IO uses long-polling only")
+
+    # The pool bounds concurrent connections; further clients wait in the backlog
+    options = {"spawn": Pool(capacity()), "log": None}
+    if handler_class is not None:
+        options["handler_class"] = handler_class
+    WSGIServer((host, port), app, **options).serve_forever()
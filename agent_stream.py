@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Output streaming helpers
+Buffers and coalesces agent output so the reader never waits on clients, and
+pushes metrics to clients as versioned patches
+"""
+
+import secrets
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+class CoalescingEmitter:
+    """Batch log lines into frames and fan them out with per-client backpressure.
+
+    The reader thread only appends to an in-memory buffer. A flusher thread
+    sends a `log_lines` frame every `interval` seconds, or sooner once
+    `max_lines` are waiting. Every frame is acknowledged by the client; a
+    client with `max_inflight` unacknowledged frames is skipped and later gets
+    a one-line summary of what it missed instead of the backlog.
+    """
+
+    def __init__(self, emit, interval=0.1, max_lines=200, max_pending=5000, max_inflight=4,
+                 ack_timeout=10.0):
+        # emit(event, data, to=None, callback=None), e.g. socketio.emit
+        self.emit = emit
+        self.interval = interval
+        self.max_lines = max_lines
+        self.max_inflight = max_inflight
+        self.ack_timeout = ack_timeout
+        self.pending = deque(maxlen=max_pending)
+        self.overflow = 0
+        self.progress = None
+        self.progress_dirty = False
+        self.clients = {}
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def add_client(self, sid):
+        with self.cond:
+            self.clients[sid] = {"inflight": 0, "skipped": 0, "last_ack": time.monotonic()}
+
+    def remove_client(self, sid):
+        with self.cond:
+            self.clients.pop(sid, None)
+
+    def push_line(self, line):
+        """Queue one output line; never blocks on the network"""
+        with self.cond:
+            if len(self.pending) == self.pending.maxlen:
+                self.overflow += 1
+            self.pending.append(line)
+            if len(self.pending) >= self.max_lines:
+                self.cond.notify()
+
+    def set_progress(self, loop, phase, progress):
+        """Record progress; it is only sent when loop or phase changed"""
+        with self.cond:
+            if self.progress and (self.progress['loop'], self.progress['phase']) == (loop, phase):
+                return
+            self.progress = {'loop': loop, 'phase': phase, 'progress': progress}
+            self.progress_dirty = True
+            self.cond.notify()
+
+    def flush(self):
+        """Send whatever is buffered right now"""
+        with self.cond:
+            lines = [self.pending.popleft() for _ in range(min(len(self.pending), self.max_lines))]
+            overflow, self.overflow = self.overflow, 0
+            progress = self.progress if self.progress_dirty else None
+            self.progress_dirty = False
+            targets = []
+            now = time.monotonic()
+            for sid, state in self.clients.items():
+                if state["inflight"] >= self.max_inflight and now - state["last_ack"] > self.ack_timeout:
+                    # Acks were lost (e.g. a reconnect); give the client a fresh window
+                    state["inflight"] = 0
+                if state["inflight"] >= self.max_inflight:
+                    state["skipped"] += len(lines)
+                    continue
+                skipped = state["skipped"] + overflow
+                state["skipped"] = 0
+                if lines or skipped:
+                    if state["inflight"] == 0:
+                        state["last_ack"] = now
+                    state["inflight"] += 1
+                    targets.append((sid, skipped))
+
+        if progress:
+            self.emit('progress_update', progress)
+
+        timestamp = datetime.now().isoformat()
+        for sid, skipped in targets:
+            frame = lines
+            if skipped:
+                frame = [f"… {skipped} lines skipped (client too slow)\n"] + lines
+            try:
+                self.emit('log_lines', {'lines': frame, 'timestamp': timestamp},
+                          to=sid, callback=lambda *args, sid=sid: self._ack(sid))
+            except Exception as e:
+                print(f"Error emitting log frame: {e}")
+                self._ack(sid)
+
+        return len(lines)
+
+    def _ack(self, sid):
+        with self.cond:
+            state = self.clients.get(sid)
+            if state and state["inflight"] > 0:
+                state["inflight"] -= 1
+                state["last_ack"] = time.monotonic()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: len(self.pending) >= self.max_lines or self.progress_dirty,
+                                   timeout=self.interval)
+            started = time.monotonic()
+            while self.flush() >= self.max_lines:
+                # Keep draining a burst, but give the buffer a chance to coalesce
+                if time.monotonic() - started > self.interval:
+                    break
+
+
+def _pointer(path):
+    """RFC 6901 JSON pointer for a list of keys"""
+    return ''.join('/' + str(key).replace('~', '~0').replace('/', '~1') for key in path)
+
+
+def json_diff(old, new, path=()):
+    """RFC 6902 operations turning `old` into `new`.
+
+    Dicts are diffed key by key. A list that only grew gets its new items
+    appended (time series mostly grow at the end); any other list change
+    replaces the list.
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": _pointer(path + (key,))})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": _pointer(path + (key,)), "value": value})
+            else:
+                ops.extend(json_diff(old[key], value, path + (key,)))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(new) > len(old) and new[:len(old)] == old:
+        return [{"op": "add", "path": _pointer(path + ("-",)), "value": item} for item in new[len(old):]]
+    return [{"op": "replace", "path": _pointer(path), "value": new}]
+
+
+class DeltaPublisher:
+    """One server-side state, pushed to every client as versioned patches.
+
+    `compute()` runs at most once per `min_interval` after `touch()` (an
+    event arrived) and otherwise every `interval` seconds for time-based
+    fields - and only while clients are connected. Each change is broadcast
+    as a `metrics_patch` {epoch, base, version, ops}; a client whose version
+    is not `base` asks for a catch-up with `catch_up(version, epoch)`, which
+    returns the ops since that version, or the full state if they are no
+    longer kept. Versions restart with every process, so a client holding
+    another `epoch` (a server restart) always gets the full state.
+    """
+
+    def __init__(self, emit, compute, interval=5.0, min_interval=1.0, history=100,
+                 event='metrics_patch'):
+        self.emit = emit
+        self.compute = compute
+        self.interval = interval
+        self.min_interval = min_interval
+        self.event = event
+        self.epoch = secrets.token_hex(8)
+        self.state = None
+        self.computed_at = None
+        self.version = 0
+        self.patches = deque(maxlen=history)
+        self.clients = 0
+        self.dirty = False
+        self.cond = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        with self.cond:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def add_client(self):
+        with self.cond:
+            self.clients += 1
+            self.cond.notify()
+
+    def remove_client(self):
+        with self.cond:
+            self.clients = max(self.clients - 1, 0)
+
+    def touch(self):
+        """Something changed; recompute soon (coalesced with other touches)"""
+        with self.cond:
+            self.dirty = True
+            self.cond.notify()
+
+    def publish(self):
+        """Recompute now and broadcast the difference; returns the new version"""
+        with self.cond:
+            # Touches from here on are not covered by this computation
+            self.dirty = False
+        state = self.compute()
+        with self.cond:
+            self.computed_at = time.monotonic()
+            if self.state is None:
+                self.state = state
+                self.version += 1
+                return self.version
+            ops = json_diff(self.state, state)
+            if not ops:
+                return self.version
+            base = self.version
+            self.state = state
+            self.version += 1
+            self.patches.append((self.version, ops))
+            message = {"epoch": self.epoch, "base": base, "version": self.version, "ops": ops}
+        try:
+            self.emit(self.event, message)
+        except Exception as e:
+            print(f"Error emitting metrics patch: {e}")
+        return message["version"]
+
+    def catch_up(self, version, epoch=None):
+        """Message bringing a client from `version` of `epoch` to the current state"""
+        with self.cond:
+            # Nothing is computed while no client is connected, so the first
+            # client after a quiet spell would otherwise get old numbers
+            stale = (self.state is None or self.dirty
+                     or time.monotonic() - self.computed_at >= self.interval)
+        if stale:
+            self.publish()
+        with self.cond:
+            if epoch != self.epoch:
+                return {"epoch": self.epoch, "version": self.version, "full": self.state}
+            if version == self.version:
+                return {"epoch": self.epoch, "base": version, "version": self.version, "ops": []}
+            if self.patches and 0 < version < self.version and self.patches[0][0] <= version + 1:
+                ops = [op for number, patch in self.patches if number > version for op in patch]
+                return {"epoch": self.epoch, "base": version, "version": self.version, "ops": ops}
+            return {"epoch": self.epoch, "version": self.version, "full": self.state}
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.clients and self.dirty, timeout=self.interval)
+                active = self.clients > 0
+            if active:
+                try:
+                    self.publish()
+                except Exception as e:
+                    print(f"Error computing metrics: {e}")
+            time.sleep(self.min_interval)
+
+
+class LineRing:
+    """Bounded ring buffer between the output reader and slow line consumers.
+
+    `push()` is O(1) and never blocks: when `capacity` lines are waiting the
+    oldest is overwritten and counted. Worker threads drain the buffer in
+    batches and call `consume(line)` for each line, reporting overwritten
+    lines as one summary line. Use one worker for consumers that depend on
+    line order (event classification does); more only for ones that do not.
+    """
+
+    def __init__(self, consume, capacity=20000, workers=1, batch=500):
+        self.consume = consume
+        self.batch = batch
+        self.workers = workers
+        self.buffer = deque(maxlen=capacity)
+        self.dropped = 0
+        self.dropped_total = 0
+        self.consumed = 0
+        self.busy = 0
+        self.cond = threading.Condition()
+        self.threads = []
+
+    def start(self):
+        with self.cond:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self._run, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def push(self, line):
+        with self.cond:
+            if len(self.buffer) == self.buffer.maxlen:
+                self.dropped += 1
+                self.dropped_total += 1
+            self.buffer.append(line)
+            # drain() waits on the same condition; notify() could wake it
+            # instead of a worker and leave the line sitting in the buffer
+            self.cond.notify_all()
+
+    def drain(self, timeout=5.0):
+        """Wait until everything pushed so far has been consumed"""
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.buffer and not self.busy, timeout=timeout)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.buffer)
+                lines = [self.buffer.popleft() for _ in range(min(len(self.buffer), self.batch))]
+                dropped, self.dropped = self.dropped, 0
+                self.busy += 1
+            count = len(lines)
+            if dropped:
+                lines.insert(0, f"… {dropped} lines dropped (output consumer too slow)\n")
+            for line in lines:
+                try:
+                    self.consume(line)
+                except Exception as e:
+                    print(f"Error consuming output line: {e}")
+            with self.cond:
+                self.busy -= 1
+                self.consumed += count
+                self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {
+                "buffered": len(self.buffer),
+                "capacity": self.buffer.maxlen,
+                "consumed": self.consumed,
+                "dropped": self.dropped_total
+            }
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Phase timing instrumentation
+Derives model/build/repair/pause durations from the streamed output
+"""
+
+import threading
+import time
+
+from agent_events import (
+    BUILD_CHECK, BUILD_FAILED, BUILD_SUCCESS, CHECKPOINT, HOLD, LOOP_START, PAUSE,
+    PHASE_NAMES, PHASE_START, REPAIR_FAILED, REPAIR_SUCCESS, REPAIR_VERIFY, RESUME, VALIDATION
+)
+
+# Segment names
+MODEL = "model"
+BUILD = "build"
+REPAIR = "repair"
+PAUSE_SEGMENT = "pause"
+PHASE = "phase"
+
+# Exponential bucket bounds in seconds: 0.25s * 1.25^i, up to ~4h
+BUCKET_BOUNDS = [0.25 * 1.25 ** i for i in range(60)]
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with percentile estimates"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        index = 0
+        while index < len(BUCKET_BOUNDS) and seconds > BUCKET_BOUNDS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (capped at max)"""
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                bound = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+                return round(min(bound, self.max), 2)
+        return round(self.max, 2)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 2) if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": round(self.max, 2)
+        }
+
+
+class PhaseTimer:
+    """State machine over classified output lines that times each segment.
+
+    A phase runs model -> build, and on a failed build continues with
+    repair -> build (verification). Pauses run from "Pause for N seconds"
+    to the next loop header. Durations go into histograms per segment and
+    per (phase type, segment). Time spent paused from the control panel
+    (hold -> resume) is left out of whatever was being timed.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.segments = {}
+        self.by_phase = {}
+        self.run_started = None
+        self.run_ended = None
+        self.phase = None
+        self.phase_started = None
+        self.segment = None
+        self.segment_started = None
+        self.held_at = None
+        self.paused_total = 0.0
+
+    def start_run(self):
+        with self.lock:
+            self.reset()
+            self.run_started = self.clock()
+
+    def end_run(self):
+        with self.lock:
+            now = self.clock()
+            self._close_segment(now)
+            self._close_phase(now)
+            self.run_ended = now
+
+    def _record(self, segment, seconds, phase=None):
+        self.segments.setdefault(segment, LatencyHistogram()).record(seconds)
+        name = PHASE_NAMES.get(phase)
+        if name:
+            self.by_phase.setdefault(name, {}).setdefault(segment, LatencyHistogram()).record(seconds)
+
+    def _open_segment(self, segment, now):
+        self._close_segment(now)
+        self.segment = segment
+        self.segment_started = now
+
+    def _close_segment(self, now):
+        if self.segment is not None:
+            self._record(self.segment, now - self.segment_started, self.phase)
+        self.segment = None
+        self.segment_started = None
+
+    def _close_phase(self, now):
+        if self.phase_started is not None:
+            self._record(PHASE, now - self.phase_started, self.phase)
+        self.phase_started = None
+
+    def observe(self, event):
+        """Advance the state machine with one LogEvent (None is ignored)"""
+        if event is None or event.kind is None:
+            return
+        with self.lock:
+            now = self.clock()
+            if self.run_started is None:
+                self.run_started = now
+            kind = event.kind
+
+            if kind == LOOP_START:
+                self._close_segment(now)
+                self._close_phase(now)
+                self.phase = None
+            elif kind == PHASE_START:
+                self._close_segment(now)
+                self._close_phase(now)
+                self.phase = event.number
+                self.phase_started = now
+                self._open_segment(MODEL, now)
+            elif kind in (BUILD_CHECK, REPAIR_VERIFY):
+                self._open_segment(BUILD, now)
+            elif kind == VALIDATION:
+                # Checkpoint builds belong to the loop, not to the last phase
+                self._close_phase(now)
+                self.phase = None
+                self._open_segment(BUILD, now)
+            elif kind == BUILD_FAILED:
+                self._open_segment(REPAIR, now)
+            elif kind in (BUILD_SUCCESS, REPAIR_SUCCESS, REPAIR_FAILED):
+                self._close_segment(now)
+                self._close_phase(now)
+            elif kind == CHECKPOINT:
+                self._close_segment(now)
+            elif kind == PAUSE:
+                self._close_phase(now)
+                self.phase = None
+                self._open_segment(PAUSE_SEGMENT, now)
+            elif kind == HOLD:
+                if self.held_at is None:
+                    self.held_at = now
+            elif kind == RESUME and self.held_at is not None:
+                held = now - self.held_at
+                if self.segment_started is not None:
+                    self.segment_started += held
+                if self.phase_started is not None:
+                    self.phase_started += held
+                self.paused_total += held
+                self.held_at = None
+
+    def total_runtime(self):
+        with self.lock:
+            if self.run_started is None:
+                return 0.0
+            end = self.run_ended if self.run_ended is not None else self.clock()
+            return round(end - self.run_started, 2)
+
+    def snapshot(self):
+        """Histogram summaries plus what is being timed right now"""
+        runtime = self.total_runtime()
+        with self.lock:
+            now = self.clock()
+            current = None
+            if self.segment is not None:
+                current = {
+                    "segment": self.segment,
+                    "phase": self.phase,
+                    "elapsed": round(now - self.segment_started, 2)
+                }
+            return {
+                "segments": {name: hist.summary() for name, hist in self.segments.items()},
+                "by_phase": {
+                    phase: {name: hist.summary() for name, hist in hists.items()}
+                    for phase, hists in self.by_phase.items()
+                },
+                "current": current,
+                "paused_total": round(self.paused_total, 2),
+                "total_runtime": runtime
+            }
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Scalesite Agent - Job scheduler under AGENT_SERVER_MODE=gevent
+Two jobs run their asyncio loops (and subprocesses) at the same time, and a
+child writing more than a pipe buffer does not deadlock its loop
+"""
+
+import importlib.util
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter: monkey-patching has to happen before any import
+SCRIPT = r'''
+import asyncio
+import sys
+import tempfile
+import time
+
+import agent_server
+import agent_jobs
+
+assert agent_server.SERVER_MODE == "gevent", agent_server.SERVER_MODE
+
+
+class FakeOrchestrator:
+    def __init__(self, config, on_line=None, **kwargs):
+        self.on_line = on_line
+        self.loop = None
+        self.task = None
+
+    async def run(self):
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, '-c', 'print("built")', stdout=asyncio.subprocess.PIPE)
+        out, _ = await proc.communicate()
+        self.on_line(out.decode())
+        # Far beyond the 64 KiB pipe buffer, read while the child still runs
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, '-c', 'import sys; sys.stdout.write("x" * 500000)',
+            stdout=asyncio.subprocess.PIPE)
+        size = 0
+        while True:
+            data = await proc.stdout.read(65536)
+            if not data:
+                break
+            size += len(data)
+        await proc.wait()
+        self.on_line(f"{size} bytes")
+        await asyncio.sleep(0.5)
+        return proc.returncode
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.task.cancel)
+
+    def pause_status(self):
+        return None
+
+
+agent_jobs.Orchestrator = FakeOrchestrator
+scheduler = agent_jobs.JobScheduler(max_running=2)
+jobs = [scheduler.submit(tempfile.mkdtemp(), {}) for _ in range(2)]
+started = time.monotonic()
+while any(job.status not in agent_jobs.FINISHED_STATES for job in jobs):
+    if time.monotonic() - started > 20:
+        break
+    time.sleep(0.05)
+elapsed = time.monotonic() - started
+
+for job in jobs:
+    print(job.id, job.status, job.error, list(job.lines))
+assert all(job.status == agent_jobs.DONE for job in jobs)
+assert all(list(job.lines) == ["built", "500000 bytes"] for job in jobs)
+# Both sleeps overlap when the loops really run side by side
+assert elapsed < 0.95, elapsed
+'''
+
+
+@unittest.skipIf(importlib.util.find_spec("gevent") is None, "gevent is not installed")
+class GeventJobsTest(unittest.TestCase):
+
+    def test_two_jobs_run_concurrently(self):
+        env = dict(os.environ, AGENT_SERVER_MODE="gevent")
+        result = subprocess.run(
+            [sys.executable, '-c', SCRIPT],
+            capture_output=True,
+            text=True,
+            cwd=ROOT,
+            env=env,
+            timeout=60
+        )
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()